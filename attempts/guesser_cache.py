@@ -1,77 +1,99 @@
+import sys
 from random import choice
 import yaml
 from rich.console import Console
-import math
 from collections import Counter, defaultdict
-from functools import lru_cache
+import numpy as np
+from common import YamlLoader, encode_words, encode_feedback, feedback_matrix, load_pattern_matrix
 
 USE_FREQUENCY = False  # Toggle frequency usage
 
+def build_pattern_matrix(W):
+    """Feedback of every guess against every answer, packed as a base-3 code
+    (2 = right position, 1 = wrong position, 0 = not in word) in a uint8 matrix,
+    from whole-matrix comparisons of the (N, 5) letter codes W"""
+    green = W[:, None, :] == W[None, :, :]
+    pattern = np.zeros(green.shape[:2], dtype=np.uint8)
+    for k in range(5):
+        # Yellow if fewer earlier non-green copies of the letter than non-green copies in the answer
+        available = ((W[:, None, k, None] == W[None, :, :]) & ~green).sum(axis=2)
+        earlier = ((W[:, :k] == W[:, k:k + 1])[:, None, :] & ~green[:, :, :k]).sum(axis=2)
+        yellow = ~green[:, :, k] & (earlier < available)
+        pattern = pattern * 3 + np.where(green[:, :, k], 2, yellow).astype(np.uint8)
+    return pattern
+
+_DATA = None
+
+def _load():
+    """Word list and the tables derived from it, shared by every Guesser"""
+    # Interned so dict lookups on words compare by identity
+    word_list = [sys.intern(w) for w in yaml.load(open('r_wordlist.yaml'), Loader=YamlLoader)]
+    letters = encode_words(word_list)  # (N, 5) letter codes
+    # presence[i, k] is 1 if letter k appears (at least once) in word i
+    presence = np.zeros((len(word_list), 26), dtype=np.uint8)
+    presence[np.arange(len(letters))[:, None], letters] = 1
+    return {
+        'word_list': word_list,
+        'word_id': {w: i for i, w in enumerate(word_list)},
+        'letters': letters,
+        'presence': presence,
+        'pattern_matrix': load_pattern_matrix(word_list, letters, build=build_pattern_matrix),
+        'extra_rows': {},  # feedback rows of guesses outside the list, such as dummy guesses
+    }
+
+def _data():
+    """Load the shared tables on first use"""
+    global _DATA
+    if _DATA is None:
+        _DATA = _load()
+    return _DATA
+
 class Guesser:
     def __init__(self, manual, use_frequency=USE_FREQUENCY):
-        self.word_list = yaml.load(open('r_wordlist.yaml'), Loader=yaml.FullLoader)
+        data = _data()
+        self.word_list = data['word_list']
         self._manual = manual 
         self.console = Console()
+        # Rich is only worth its markup handling when a person is playing
+        self._print = self.console.print if manual == 'manual' else print
         self._tried = []  # List of words already guessed in the current game
-        self.candidates = self.word_list.copy()  # All words are initially candidates
+        self.cand_mask = np.ones(len(self.word_list), dtype=bool)  # All words are initially candidates
+        self._tried_mask = np.zeros(len(self.word_list), dtype=bool)  # Same guesses, as a mask over word_list
         self.last_guess = None
         self.use_frequency = use_frequency
         self.dummy_used = False
-        self.feedback_cache = {}  # Cache for get_feedback results
         self.entropy_cache = {}   # Cache for entropy calculations
+        self.word_id = data['word_id']
+        self.extra_rows = data['extra_rows']
+        self.letters = data['letters']
+        self.presence = data['presence']
+        self.pattern_matrix = data['pattern_matrix']
         
         # Load frequency data if needed
         if self.use_frequency:
-            self.freq = {}
-            with open('wordlist.tsv') as f:
-                for line in f:
-                    parts = line.strip().split('\t')
-                    if len(parts) >= 2:
-                        word = parts[0]
-                        try:
-                            frequency = float(parts[1])
-                        except ValueError:
-                            frequency = 1.0
-                        self.freq[word] = frequency
+            # Columns are index, word, frequency
+            table = np.loadtxt('wordlist.tsv', dtype=str, delimiter='\t', skiprows=1, usecols=(1, 2))
+            self.freq = dict(zip(table[:, 0], table[:, 1].astype(float)))
         else:
             self.freq = defaultdict(lambda: 1.0)
+        self.freq_vec = np.array([self.freq.get(w, 1.0) for w in self.word_list])
 
     def restart_game(self):
         self._tried = []
-        self.candidates = self.word_list.copy()
+        self.cand_mask = np.ones(len(self.word_list), dtype=bool)
+        self._tried_mask[:] = False
         self.last_guess = None
         self.dummy_used = False
         # Keep caches across games to benefit from previous calculations
 
-    # Using lru_cache to cache feedback calculations
-    @lru_cache(maxsize=10000)
-    def _cached_feedback(self, guess, answer):
-        """Cached version of feedback calculation"""
-        counts = Counter(answer)
-        feedback = [''] * len(guess)
-        
-        # First pass: mark correct positions
-        for i, letter in enumerate(guess):
-            if letter == answer[i]:
-                feedback[i] = letter
-                counts[letter] -= 1
-            else:
-                feedback[i] = '+'
-        
-        # Second pass: mark letters in wrong positions
-        for i, letter in enumerate(guess):
-            if letter != answer[i] and letter in answer and counts[letter] > 0:
-                feedback[i] = '-'
-                counts[letter] -= 1
-                
-        return ''.join(feedback)
-
-    def get_feedback(self, guess, answer):
-        # Use the cache key since tuples are hashable
-        cache_key = (guess, answer)
-        if cache_key not in self.feedback_cache:
-            self.feedback_cache[cache_key] = self._cached_feedback(guess, answer)
-        return self.feedback_cache[cache_key]
+    def feedback_row(self, guess):
+        """Feedback codes of a guess against every word in the list"""
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess]]
+        # Off-list guesses get their whole row from one kernel call, kept for later games
+        if guess not in self.extra_rows:
+            self.extra_rows[guess] = feedback_matrix(encode_words([guess]), self.letters)[0]
+        return self.extra_rows[guess]
     
     def try_dummy_guess(self, candidates_to_consider, result):
         if result.count('+') <= 1 and result.count('-') == 0 and not self.dummy_used and len(self._tried) < 5:
@@ -90,46 +112,31 @@ class Guesser:
             return dummy_letters
         return None
 
-    def calculate_entropy(self, candidate, candidates_to_consider, total_weight):
-        """Calculate entropy for a candidate word with careful preservation of original logic"""
-        # Only cache if the candidate list is reasonably small
-        should_cache = len(candidates_to_consider) < 1000
+    def calculate_entropy(self, cand_idx, weights, total_weight):
+        """Calculate entropy for every candidate at once from a 2D histogram of the pattern matrix"""
+        # Keyed by the candidate indices as bytes; the weights and total follow from them
+        key = cand_idx.tobytes()
+        if key in self.entropy_cache:
+            return self.entropy_cache[key]
         
-        if should_cache:
-            # Use a more precise cache key that preserves order
-            cache_key = (candidate, tuple(sorted(candidates_to_consider)))
-            if cache_key in self.entropy_cache:
-                return self.entropy_cache[cache_key]
+        # Offset each guess row into its own block of 243 bins so one bincount covers all rows
+        n = len(cand_idx)
+        sub = self.pattern_matrix[np.ix_(cand_idx, cand_idx)]
+        flat = (sub + 243 * np.arange(n)[:, None]).ravel()
+        w = np.tile(weights, n) if weights is not None else None
+        counts = np.bincount(flat, weights=w, minlength=243 * n).reshape(n, 243)
+        p = counts / total_weight
+        logp = np.log2(p, where=p > 0, out=np.zeros_like(p))
+        entropy = -(p * logp).sum(axis=1)
         
-        # Create pattern distribution exactly as in the original
-        distribution = {}
-        for answer in candidates_to_consider:
-            pattern = self.get_feedback(candidate, answer)
-            weight = self.freq.get(answer, 1) if self.use_frequency else 1
-            distribution[pattern] = distribution.get(pattern, 0) + weight
-        
-        # Calculate entropy with high precision
-        entropy = 0
-        for count in distribution.values():
-            p = count / total_weight
-            entropy -= p * math.log2(p)
-        
-        # Cache the result if appropriate
-        if should_cache:
-            self.entropy_cache[cache_key] = entropy
+        self.entropy_cache[key] = entropy
         return entropy
 
-    def get_letter_frequency_score(self, candidates_to_consider):
-        """Pre-compute letter frequencies for all candidates"""
-        letter_counts = {}
-        if self.use_frequency:
-            for word in candidates_to_consider:
-                weight = self.freq.get(word, 1)
-                for letter in set(word):
-                    letter_counts[letter] = letter_counts.get(letter, 0) + weight
-        else:
-            letter_counts = Counter(''.join(candidates_to_consider))
-        return letter_counts
+    def _add_tried(self, word):
+        """Record a guess in both the tried list and the tried mask"""
+        self._tried.append(word)
+        if word in self.word_id:  # Dummy guesses may fall outside the word list
+            self._tried_mask[self.word_id[word]] = True
 
     def get_guess(self, result):
         if self._manual == 'manual':
@@ -137,37 +144,37 @@ class Guesser:
         else:
             # Update candidates based on feedback from the previous guess
             if self.last_guess is not None:
-                self.candidates = [word for word in self.candidates 
-                                  if self.get_feedback(self.last_guess, word) == result]
+                self.cand_mask &= self.feedback_row(self.last_guess) == encode_feedback(result)
             
-            if not self.candidates:
-                self.candidates = self.word_list.copy()
+            if not self.cand_mask.any():
+                self.cand_mask[:] = True
             
-            candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-            if not candidates_to_consider:
-                candidates_to_consider = self.candidates
+            cand_idx = np.flatnonzero(self.cand_mask & ~self._tried_mask)
+            if not len(cand_idx):
+                cand_idx = np.flatnonzero(self.cand_mask)
+            candidates_to_consider = [self.word_list[i] for i in cand_idx]
             
             # If only one candidate remains, that's our guess
             if len(candidates_to_consider) == 1:
                 guess = candidates_to_consider[0]
-                self._tried.append(guess)
-                self.console.print(guess)
+                self._add_tried(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
             
             # First guess optimization - use a pre-determined optimal first word
             if self.last_guess is None:
                 guess = "tales"  # Pre-computed optimal first word
-                self._tried.append(guess)
-                self.console.print(guess)
+                self._add_tried(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
             
             # Try dummy guess is disabled for now
             dummy_guess = None
             if dummy_guess is not None:
-                self._tried.append(dummy_guess)
-                self.console.print("Dummy guess:", dummy_guess)
+                self._add_tried(dummy_guess)
+                self._print("Dummy guess:", dummy_guess)
                 self.last_guess = dummy_guess
                 return dummy_guess
             
@@ -175,41 +182,23 @@ class Guesser:
             
             # For large candidate sets, use letter frequency heuristic (faster)
             if len(candidates_to_consider) > 50:
-                letter_counts = self.get_letter_frequency_score(candidates_to_consider)
+                # Weighted count of words containing each letter, or plain count of letter occurrences
+                letter_counts = (self.presence[cand_idx].T @ self.freq_vec[cand_idx] if self.use_frequency
+                                 else np.bincount(self.letters[cand_idx].ravel(), minlength=26))
                 
-                best_score = -1
-                best_guess = None
-                
-                # Process in batches for better cache locality
-                batch_size = 50
-                for i in range(0, len(candidates_to_consider), batch_size):
-                    batch = candidates_to_consider[i:i+batch_size]
-                    for word in batch:
-                        # Count each letter only once per word
-                        score = sum(letter_counts.get(c, 0) for c in set(word))
-                        if score > best_score:
-                            best_score = score
-                            best_guess = word
-                
-                guess = best_guess
+                # Count each letter only once per word: one matrix-vector product scores every candidate
+                scores = self.presence[cand_idx] @ letter_counts
+                guess = candidates_to_consider[scores.argmax()]
             else:
                 # For smaller candidate sets, use full entropy calculation
-                best_entropy = -1
-                best_guess = None
-                
-                total_weight = (sum(self.freq.get(word, 1) for word in candidates_to_consider)
-                               if self.use_frequency else len(candidates_to_consider))
-                
-                # Calculate entropy for each candidate
-                for candidate in candidates_to_consider:
-                    entropy = self.calculate_entropy(candidate, candidates_to_consider, total_weight)
-                    if entropy > best_entropy:
-                        best_entropy = entropy
-                        best_guess = candidate
+                weights = self.freq_vec[cand_idx] if self.use_frequency else None
+                total_weight = weights.sum() if weights is not None else len(cand_idx)
                 
-                guess = best_guess
+                # Entropy of each candidate, first maximum wins as before
+                entropies = self.calculate_entropy(cand_idx, weights, total_weight)
+                guess = candidates_to_consider[entropies.argmax()]
             
-            self._tried.append(guess)
-            self.console.print(guess)
+            self._add_tried(guess)
+            self._print(guess)
             self.last_guess = guess
             return guess
\ No newline at end of file
@@ -1,69 +1,107 @@
+import sys
 from random import choice
 import yaml
 from rich.console import Console
-import math
-from collections import Counter
+import numpy as np
+from common import YamlLoader, encode_words, encode_feedback, feedback_matrix, load_pattern_matrix
 
 USE_FREQUENCY = False
 DEBUG = False 
 
+def build_pattern_matrix(W):
+    """Feedback of every guess against every answer, packed as a base-3 code
+    (2 = right position, 1 = wrong position, 0 = not in word) in a uint8 matrix,
+    from whole-matrix comparisons of the (N, 5) letter codes W"""
+    green = W[:, None, :] == W[None, :, :]
+    pattern = np.zeros(green.shape[:2], dtype=np.uint8)
+    for k in range(5):
+        # Yellow if fewer earlier non-green copies of the letter than non-green copies in the answer
+        available = ((W[:, None, k, None] == W[None, :, :]) & ~green).sum(axis=2)
+        earlier = ((W[:, :k] == W[:, k:k + 1])[:, None, :] & ~green[:, :, :k]).sum(axis=2)
+        yellow = ~green[:, :, k] & (earlier < available)
+        pattern = pattern * 3 + np.where(green[:, :, k], 2, yellow).astype(np.uint8)
+    return pattern
+
+_DATA = None
+
+def _load():
+    """Word list and the tables derived from it, shared by every Guesser"""
+    # Interned so dict lookups on words compare by identity
+    word_list = [sys.intern(w) for w in yaml.load(open('dev_wordlist.yaml'), Loader=YamlLoader)]
+    letters = encode_words(word_list)  # (N, 5) letter codes
+    # presence[i, k] is 1 if letter k appears (at least once) in word i
+    presence = np.zeros((len(word_list), 26), dtype=np.uint8)
+    presence[np.arange(len(letters))[:, None], letters] = 1
+    # letter_bits[i] has bit k set if letter k appears in word i
+    letter_bits = np.bitwise_or.reduce(1 << letters.astype(np.uint32), axis=1)
+    return {
+        'word_list': word_list,
+        'word_id': {w: i for i, w in enumerate(word_list)},
+        'letters': letters,
+        'presence': presence,
+        'letter_bits': letter_bits,
+        'pattern_matrix': load_pattern_matrix(word_list, letters, build=build_pattern_matrix),
+        'extra_rows': {},  # feedback rows of guesses outside the list, such as dummy guesses
+    }
+
+def _data():
+    """Load the shared tables on first use"""
+    global _DATA
+    if _DATA is None:
+        _DATA = _load()
+    return _DATA
+
 class Guesser:
     def __init__(self, manual, use_frequency=USE_FREQUENCY):
-        self.word_list = yaml.load(open('dev_wordlist.yaml'), Loader=yaml.FullLoader)
+        data = _data()
+        self.word_list = data['word_list']
         self._manual = manual 
         self.console = Console()
+        # Rich is only worth its markup handling when a person is playing
+        self._print = self.console.print if manual == 'manual' else print
         self._tried = []  # List of words already guessed in the current game
-        self.candidates = self.word_list.copy()  # All words are initially candidates
+        self.cand_mask = np.ones(len(self.word_list), dtype=bool)  # All words are initially candidates
+        self._tried_mask = np.zeros(len(self.word_list), dtype=bool)  # Same guesses, as a mask over word_list
         self.last_guess = None
         self.use_frequency = use_frequency
         self.dummy_used = False
+        self.word_id = data['word_id']
+        self.extra_rows = data['extra_rows']
+        self.letters = data['letters']
+        self.presence = data['presence']
+        self.letter_bits = data['letter_bits']
+        self._tried_bits = 0  # OR of letter_bits over the guesses of the current game
+        self.pattern_matrix = data['pattern_matrix']
         if self.use_frequency:
-            self.freq = {}
-            with open('dev_wordlist.tsv') as f:
-                for line in f:
-                    parts = line.strip().split('\t')
-                    if len(parts) >= 2:
-                        word = parts[0]
-                        try:
-                            frequency = float(parts[1])
-                        except ValueError:
-                            frequency = 1.0
-                        self.freq[word] = frequency
+            # Columns are index, word, frequency
+            table = np.loadtxt('dev_wordlist.tsv', dtype=str, delimiter='\t', skiprows=1, usecols=(1, 2))
+            self.freq = dict(zip(table[:, 0], table[:, 1].astype(float)))
+            self.freq_vec = np.array([self.freq.get(w, 1.0) for w in self.word_list])
 
     def restart_game(self):
         self._tried = []
-        self.candidates = self.word_list.copy()
+        self.cand_mask = np.ones(len(self.word_list), dtype=bool)
+        self._tried_mask[:] = False
+        self._tried_bits = 0
         self.last_guess = None
         self.dummy_used = False
-
-    def get_feedback(self, guess, answer): 
-        counts = Counter(answer)
-        feedback = [''] * len(guess)
-        for i, letter in enumerate(guess):
-            if letter == answer[i]:
-                feedback[i] = letter
-                counts[letter] -= 1
-            else:
-                feedback[i] = '+'
-        for i, letter in enumerate(guess):
-            if letter != answer[i] and letter in answer and counts[letter] > 0:
-                feedback[i] = '-'
-                counts[letter] -= 1
-        return ''.join(feedback)
     
-    def try_dummy_guess(self, candidates_to_consider, result):
-        tried_letters = set(''.join(self._tried))
+    def try_dummy_guess(self, cand_idx, result):
+        tried = (self._tried_bits >> np.arange(26)) & 1 == 1  # tried[k] if letter k was already guessed
+        tried_letters = {chr(97 + k) for k in np.flatnonzero(tried)}
         if result.count('-') != 0 or self.dummy_used or len(self._tried) >= 5:
             return None
+        cols = self.letters[cand_idx]
         if result.count('+') == 1:
             pos = result.index('+')
-            letters = [word[pos] for word in candidates_to_consider]
-            avail = set(letters) - tried_letters
-            if len(avail) < 3:
-                avail = set(letters)
-            if len(avail) < 3:
+            counts = np.bincount(cols[:, pos], minlength=26)
+            avail = (counts > 0) & ~tried
+            if avail.sum() < 3:
+                avail = counts > 0
+            if avail.sum() < 3:
                 return None
-            distinct = sorted(avail, key=lambda x: -letters.count(x))
+            # Most common letters first, ties in alphabetical order
+            distinct = [chr(97 + k) for k in np.argsort(-counts, kind='stable') if avail[k]]
             for letter in "abcdefghijklmnopqrstuvwxyz":
                 if letter not in distinct and letter not in tried_letters:
                     distinct.append(letter)
@@ -75,36 +113,35 @@ class Guesser:
         elif result.count('+') == 2:
             positions = [i for i, ch in enumerate(result) if ch == '+']
             pos0, pos1 = positions
-            letters0 = [word[pos0] for word in candidates_to_consider]
-            letters1 = [word[pos1] for word in candidates_to_consider]
-            avail0 = set(letters0) - tried_letters
-            if len(avail0) < 2:
-                avail0 = set(letters0)
-            avail1 = set(letters1) - tried_letters
-            if len(avail1) < 2:
-                avail1 = set(letters1)
-            if len(avail0) + len(avail1) < 4:
+            counts0 = np.bincount(cols[:, pos0], minlength=26)
+            counts1 = np.bincount(cols[:, pos1], minlength=26)
+            avail0 = (counts0 > 0) & ~tried
+            if avail0.sum() < 2:
+                avail0 = counts0 > 0
+            avail1 = (counts1 > 0) & ~tried
+            if avail1.sum() < 2:
+                avail1 = counts1 > 0
+            n0, n1 = avail0.sum(), avail1.sum()
+            if n0 + n1 < 4:
                 return None
-            if len(avail0) >= 2 and len(avail1) >= 2:
-                part0 = sorted(avail0, key=lambda x: -letters0.count(x))[:2]
-                part1 = sorted(avail1, key=lambda x: -letters1.count(x))[:2]
-            elif len(avail0) == 1 and len(avail1) >= 3:
-                part0 = sorted(avail0, key=lambda x: -letters0.count(x))[:1]
-                part1 = sorted(avail1, key=lambda x: -letters1.count(x))[:3]
-            elif len(avail1) == 1 and len(avail0) >= 3:
-                part1 = sorted(avail1, key=lambda x: -letters1.count(x))[:1]
-                part0 = sorted(avail0, key=lambda x: -letters0.count(x))[:3]
+            order0 = [chr(97 + k) for k in np.argsort(-counts0, kind='stable') if avail0[k]]
+            order1 = [chr(97 + k) for k in np.argsort(-counts1, kind='stable') if avail1[k]]
+            if n0 >= 2 and n1 >= 2:
+                part0, part1 = order0[:2], order1[:2]
+            elif n0 == 1 and n1 >= 3:
+                part0, part1 = order0[:1], order1[:3]
+            elif n1 == 1 and n0 >= 3:
+                part0, part1 = order0[:3], order1[:1]
             else:
-                part0 = sorted(avail0, key=lambda x: -letters0.count(x))[:2]
-                part1 = sorted(avail1, key=lambda x: -letters1.count(x))[:2]
+                part0, part1 = order0[:2], order1[:2]
             union_letters = set(part0 + part1)
             if len(union_letters) < 4:
                 return None
-            overall = sorted(
-                set(letter for word in candidates_to_consider for letter in word) - union_letters - tried_letters,
-                key=lambda x: -sum(letter == x for word in candidates_to_consider for letter in word)
-            )
-            common_letter = overall[0] if overall else 'a'
+            counts = np.bincount(cols.ravel(), minlength=26)
+            rest = (counts > 0) & ~tried
+            rest[[ord(c) - 97 for c in union_letters]] = False
+            overall = [k for k in np.argsort(-counts, kind='stable') if rest[k]]
+            common_letter = chr(97 + overall[0]) if overall else 'a'
             dummy = ''.join(sorted(union_letters)) + common_letter
             if len(dummy) < 5:
                 for letter in "abcdefghijklmnopqrstuvwxyz":
@@ -118,90 +155,85 @@ class Guesser:
             return dummy
         return None
 
+    def feedback_row(self, guess):
+        """Feedback codes of a guess against every word in the list"""
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess]]
+        if guess not in self.extra_rows:
+            self.extra_rows[guess] = feedback_matrix(encode_words([guess]), self.letters)[0]
+        return self.extra_rows[guess]
+
+    def _add_tried(self, word):
+        """Record a guess in both the tried list and the tried mask"""
+        self._tried.append(word)
+        if word in self.word_id:  # Dummy guesses may fall outside the word list
+            self._tried_mask[self.word_id[word]] = True
+            self._tried_bits |= int(self.letter_bits[self.word_id[word]])
+        else:
+            self._tried_bits |= int(np.bitwise_or.reduce(1 << encode_words([word])[0].astype(np.uint32)))
+
     def get_guess(self, result):
         if self._manual == 'manual':
             return self.console.input('Your guess:\n')
         else: # Update candidates based on feedback from the previous guess.
             if self.last_guess is not None:
-                self.candidates = [word for word in self.candidates 
-                                   if self.get_feedback(self.last_guess, word) == result]
-            if not self.candidates:
-                self.candidates = self.word_list.copy()
+                self.cand_mask &= self.feedback_row(self.last_guess) == encode_feedback(result)
+            if not self.cand_mask.any():
+                self.cand_mask[:] = True
         
             # Exclude words that have already been tried.
-            candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-            if not candidates_to_consider:
-                candidates_to_consider = self.candidates
+            cand_idx = np.flatnonzero(self.cand_mask & ~self._tried_mask)
+            if not len(cand_idx):
+                cand_idx = np.flatnonzero(self.cand_mask)
+            candidates_to_consider = [self.word_list[i] for i in cand_idx]
             # If only one candidate remains, choose it.
             if len(candidates_to_consider) == 1:
                 guess = candidates_to_consider[0]
-                self._tried.append(guess)
-                self.console.print(guess)
+                self._add_tried(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
             # For the very first guess, use a fixed starting word.
             if self.last_guess is None:
                 guess = "tales"
-                self._tried.append(guess)
-                self.console.print(guess)
+                self._add_tried(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
 
             # --- Special Dummy Guess for Single-Letter Ambiguity ---
-            dummy_guess = self.try_dummy_guess(candidates_to_consider, result)
+            dummy_guess = self.try_dummy_guess(cand_idx, result)
             if dummy_guess is not None:
-                self._tried.append(dummy_guess)
-                self.console.print("Dummy guess:", dummy_guess)
+                self._add_tried(dummy_guess)
+                self._print("Dummy guess:", dummy_guess)
                 self.last_guess = dummy_guess
                 return dummy_guess
             
             if len(candidates_to_consider) > 50: # heuristic / entropy choice
-                if self.use_frequency:
-                    letter_counts = {}
-                    for word in candidates_to_consider:
-                        weight = self.freq.get(word, 1)
-                        for letter in set(word):
-                            letter_counts[letter] = letter_counts.get(letter, 0) + weight
-                else:
-                    letter_counts = Counter(''.join(candidates_to_consider))
-                best_score = -1
-                best_guess = None
-                scores = []
-                for word in candidates_to_consider:
-                    score = sum(letter_counts.get(c, 0) for c in set(word))
-                    scores.append((word, score))
-                    if score > best_score:
-                        best_score = score
-                        best_guess = word
+                letter_counts = (self.presence[cand_idx].T @ self.freq_vec[cand_idx] if self.use_frequency
+                                 else np.bincount(self.letters[cand_idx].ravel(), minlength=26))
+                scores = self.presence[cand_idx] @ letter_counts
                 # if DEBUG:
-                #     sorted_scores = sorted(scores, key=lambda x: x[1], reverse=True)
-                #     self.console.print("Top 5 words by letter-frequency score:", sorted_scores[:5])
-                guess = best_guess
+                #     top = np.argsort(-scores, kind='stable')[:5]
+                #     self.console.print("Top 5 words by letter-frequency score:", [(candidates_to_consider[i], scores[i]) for i in top])
+                guess = candidates_to_consider[scores.argmax()]
             else:
-                best_entropy = -1
-                best_guess = None
-                total_weight = (sum(self.freq.get(word, 1) for word in candidates_to_consider)
-                                if self.use_frequency else len(candidates_to_consider))
-                entropies = []
-                for candidate in candidates_to_consider:
-                    distribution = {}
-                    for answer in candidates_to_consider:
-                        pattern = self.get_feedback(candidate, answer)
-                        weight = self.freq.get(answer, 1) if self.use_frequency else 1
-                        distribution[pattern] = distribution.get(pattern, 0) + weight
-                    entropy = 0
-                    for count in distribution.values():
-                        p = count / total_weight
-                        entropy -= p * math.log2(p)
-                    entropies.append((candidate, entropy))
-                    if entropy > best_entropy:
-                        best_entropy = entropy
-                        best_guess = candidate
+                weights = self.freq_vec[cand_idx] if self.use_frequency else None
+                total_weight = weights.sum() if weights is not None else len(cand_idx)
+                # One bincount over all rows, each guess offset into its own block of 243 bins
+                n = len(cand_idx)
+                sub = self.pattern_matrix[np.ix_(cand_idx, cand_idx)]
+                flat = (sub + 243 * np.arange(n)[:, None]).ravel()
+                w = np.tile(weights, n) if weights is not None else None
+                counts = np.bincount(flat, weights=w, minlength=243 * n).reshape(n, 243)
+                p = counts / total_weight
+                logp = np.log2(p, where=p > 0, out=np.zeros_like(p))
+                entropies = -(p * logp).sum(axis=1)
                 # if DEBUG:
-                #     sorted_entropies = sorted(entropies, key=lambda x: x[1], reverse=True)
-                #     self.console.print("Top 5 words by entropy:", sorted_entropies[:2])
-                guess = best_guess
-            self._tried.append(guess)
-            self.console.print(guess)
+                #     top = np.argsort(-entropies)[:2]
+                #     self.console.print("Top 5 words by entropy:", [(candidates_to_consider[i], entropies[i]) for i in top])
+                guess = candidates_to_consider[entropies.argmax()]
+            self._add_tried(guess)
+            self._print(guess)
             self.last_guess = guess
         return guess
\ No newline at end of file
@@ -1,41 +1,106 @@
 from random import choice
 import yaml
 from rich.console import Console
-import math
 from collections import Counter
+import numpy as np
+from numba import njit, prange
+from common import YamlLoader, encode_words, encode_feedback, feedback_matrix, load_pattern_matrix
+
+@njit(cache=True, parallel=True)
+def weighted_entropies(pattern, rows, cols, weights):
+    """Feedback entropy of each guess row against the answer columns, each answer counted
+    with its weight, rows spread across cores"""
+    total = weights.sum()
+    out = np.empty(len(rows))
+    for r in prange(len(rows)):
+        bins = np.zeros(243)
+        for j in range(len(cols)):
+            bins[pattern[rows[r], cols[j]]] += weights[j]
+        h = 0.0
+        for b in range(243):
+            if bins[b] > 0:
+                p = bins[b] / total
+                h -= p * np.log2(p)
+        out[r] = h
+    return out
+
+def load_frequencies(word_list):
+    """Word frequencies from dev_wordlist.tsv, uniform if the file is missing"""
+    freq = {}
+    try:
+        with open('dev_wordlist.tsv') as f:
+            for line in f:
+                parts = line.strip().split('\t')
+                if len(parts) >= 2:
+                    word = parts[0]
+                    try:
+                        frequency = float(parts[1])
+                    except ValueError:
+                        frequency = 1.0
+                    freq[word] = frequency
+    except FileNotFoundError:
+        # If frequency file is not found, use uniform weights
+        freq = {word: 1.0 for word in word_list}
+    return freq
+
+_DATA = None
+
+def _load():
+    """Word list and the tables derived from it, shared by every Guesser"""
+    word_list = yaml.load(open('dev_wordlist.yaml'), Loader=YamlLoader)
+    word_list_u8 = encode_words(word_list)  # (N, 5) letter codes
+    # presence[i, k] is 1 if letter k appears (at least once) in word i
+    presence = np.zeros((len(word_list), 26), dtype=np.uint8)
+    presence[np.arange(len(word_list))[:, None], word_list_u8] = 1
+    data = {
+        'word_list': word_list,
+        'word_list_u8': word_list_u8,
+        'word_id': {w: i for i, w in enumerate(word_list)},
+        'presence': presence,
+        # Every pattern a guess from the list can produce, computed once instead of per turn
+        'pattern_matrix': load_pattern_matrix(word_list, word_list_u8),
+        'extra_rows': {},  # Rows for guesses outside the list, like the opener
+        'freq': load_frequencies(word_list),
+    }
+    # Weight of each list word as an answer, in list order
+    data['weights'] = np.array([data['freq'].get(word, 1.0) for word in word_list])
+    return data
+
+def _data():
+    """Load the shared tables on first use"""
+    global _DATA
+    if _DATA is None:
+        _DATA = _load()
+    return _DATA
 
 class Guesser:
     def __init__(self, manual, use_frequency=True):
-        self.word_list = yaml.load(open('dev_wordlist.yaml'), Loader=yaml.FullLoader)
+        # Loaded once per process and shared by every Guesser
+        data = _data()
+        self.word_list = data['word_list']
+        self.word_list_u8 = data['word_list_u8']
+        self.word_id = data['word_id']
+        self.presence = data['presence']
+        self.pattern_matrix = data['pattern_matrix']
+        self.extra_rows = data['extra_rows']
+        # Always use frequency data for better guesses
+        self.freq = data['freq']
+        self.weights = data['weights']
         self._manual = manual 
         self.console = Console()
         self._tried = []  # List of words already guessed in the current game
-        self.candidates = self.word_list.copy()  # All words are initially candidates
+        self.cand_mask = np.ones(len(self.word_list), dtype=bool)  # All words are initially candidates
+        self._tried_mask = np.zeros(len(self.word_list), dtype=bool)  # Same guesses, as a mask over word_list
         self.last_guess = None
+        self.guess_cache = {}  # Entropy picks keyed by candidate and tried ids, kept across games
         
-        # Always use frequency data for better guesses
-        self.freq = {}
-        try:
-            with open('dev_wordlist.tsv') as f:
-                for line in f:
-                    parts = line.strip().split('\t')
-                    if len(parts) >= 2:
-                        word = parts[0]
-                        try:
-                            frequency = float(parts[1])
-                        except ValueError:
-                            frequency = 1.0
-                        self.freq[word] = frequency
-        except FileNotFoundError:
-            # If frequency file is not found, use uniform weights
-            self.freq = {word: 1.0 for word in self.word_list}
-            
         # Precompute optimal first guesses (based on entropy analysis)
         self.optimal_starters = ["slate", "crane", "trace", "roate"]
 
     def restart_game(self):
         self._tried = []
-        self.candidates = self.word_list.copy()
+        self.cand_mask[:] = True
+        self._tried_mask[:] = False
         self.last_guess = None
 
     def get_feedback(self, guess, answer):
@@ -55,22 +120,14 @@ class Guesser:
                 counts[letter] -= 1
         return ''.join(feedback)
     
-    def get_pattern_distribution(self, candidate, possible_answers):
-        # Calculate the distribution of patterns when guessing this candidate
-        pattern_counts = {}
-        total_weight = sum(self.freq.get(word, 1.0) for word in possible_answers)
-        
-        for answer in possible_answers:
-            pattern = self.get_feedback(candidate, answer)
-            weight = self.freq.get(answer, 1.0)
-            pattern_counts[pattern] = pattern_counts.get(pattern, 0) + weight
-            
-        # Convert counts to probabilities
-        return {pattern: count/total_weight for pattern, count in pattern_counts.items()}
-    
-    def calculate_entropy(self, distribution):
-        # Calculate entropy from a probability distribution
-        return -sum(p * math.log2(p) for p in distribution.values())
+    def feedback_row(self, guess):
+        """Feedback codes of a guess against every word in the list,
+        read from the matrix unless the guess is not in the list (like the opener)"""
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess]]
+        if guess not in self.extra_rows:
+            self.extra_rows[guess] = feedback_matrix(encode_words([guess]), self.word_list_u8)[0]
+        return self.extra_rows[guess]
     
     def hard_mode_filter(self, previous_guess, result, candidates):
         # Filter candidates based on hard mode constraints
@@ -79,6 +136,12 @@ class Guesser:
             if self.get_feedback(previous_guess, word) == result:
                 filtered.append(word)
         return filtered
+    
+    def _add_tried(self, word):
+        """Record a guess in both the tried list and the tried mask"""
+        self._tried.append(word)
+        if word in self.word_id:  # The opener is not in the list
+            self._tried_mask[self.word_id[word]] = True
         
     def get_guess(self, result):
         if self._manual == 'manual':
@@ -86,20 +149,17 @@ class Guesser:
         
         # Update candidates based on feedback
         if self.last_guess is not None:
-            new_candidates = []
-            for word in self.candidates:
-                if self.get_feedback(self.last_guess, word) == result:
-                    new_candidates.append(word)
-            self.candidates = new_candidates
+            self.cand_mask &= self.feedback_row(self.last_guess) == encode_feedback(result)
         
         # If no candidates remain (shouldn't happen in normal play), reset
-        if not self.candidates:
-            self.candidates = [w for w in self.word_list if w not in self._tried]
+        if not self.cand_mask.any():
+            self.cand_mask = ~self._tried_mask
+        cand_idx = np.flatnonzero(self.cand_mask)
             
         # If only one candidate remains, choose it
-        if len(self.candidates) == 1:
-            guess = self.candidates[0]
-            self._tried.append(guess)
+        if len(cand_idx) == 1:
+            guess = self.word_list[cand_idx[0]]
+            self._add_tried(guess)
             self.last_guess = guess
             self.console.print(guess)
             return guess
@@ -107,68 +167,70 @@ class Guesser:
         # For the first guess, use a precomputed optimal starter
         if not self._tried:
             guess = self.optimal_starters[0]  # Use optimal first word
-            self._tried.append(guess)
+            self._add_tried(guess)
+            self.last_guess = guess
+            self.console.print(guess)
+            return guess
+            
+        # The pick only depends on the candidates and the tried words, which recur across games
+        key = (cand_idx.tobytes(), np.flatnonzero(self._tried_mask).tobytes())
+        if key in self.guess_cache:
+            guess = self.guess_cache[key]
+            self._add_tried(guess)
             self.last_guess = guess
             self.console.print(guess)
             return guess
+        candidates = [self.word_list[i] for i in cand_idx]
             
         # For all other guesses, use full entropy calculation
-        best_entropy = -1
         best_guess = None
         
         # Consider both candidates and words from the full wordlist
         # This helps find words that can eliminate more candidates, even if they can't be the answer
-        guess_pool = set(self.candidates)
+        guess_pool = set(candidates)
         
         # If we have too many candidates, limit our search to improve performance
-        if len(self.candidates) > 2:
+        if len(candidates) > 2:
             # Add some strategic non-candidate words to consider
-            remaining_candidates = self.candidates
             
             # Find which letters are most common in remaining candidates
-            letter_freq = Counter(''.join(remaining_candidates))
+            letter_counts = np.bincount(self.word_list_u8[cand_idx].ravel(), minlength=26)
             
-            # Add top words from wordlist that contain the most common letters
-            sorted_words = sorted(
-                self.word_list, 
-                key=lambda w: sum(letter_freq.get(c, 0) for c in set(w)),
-                reverse=True
-            )
-            for word in sorted_words[:100]:  # Add top 100 words with common letters
-                guess_pool.add(word)
+            # Add top words from wordlist that contain the most common letters,
+            # scoring each word once per distinct letter (stable sort keeps list order on ties)
+            scores = self.presence @ letter_counts
+            sorted_ids = np.argsort(-scores, kind='stable')
+            for i in sorted_ids[:100]:  # Add top 100 words with common letters
+                guess_pool.add(self.word_list[i])
         
-        # Calculate entropy for each potential guess
-        for candidate in guess_pool:
-            # Skip words we've already tried
-            if candidate in self._tried:
-                continue
-                
-            # Calculate pattern distribution and entropy
-            distribution = self.get_pattern_distribution(candidate, self.candidates)
-            entropy = self.calculate_entropy(distribution)
+        # Calculate entropy for each potential guess we haven't tried yet, all in one pass
+        pool = [candidate for candidate in guess_pool if not self._tried_mask[self.word_id[candidate]]]
+        if pool:
+            pool_ids = np.array([self.word_id[candidate] for candidate in pool])
+            entropies = weighted_entropies(self.pattern_matrix, pool_ids, cand_idx, self.weights[cand_idx])
             
             # Tiebreaker: prefer words that could be the answer
-            is_possible_answer = candidate in self.candidates
+            is_possible_answer = self.cand_mask[pool_ids]
             
             # Another tiebreaker: prefer more common words
-            frequency = self.freq.get(candidate, 0.5)
+            frequency = np.array([self.freq.get(candidate, 0.5) for candidate in pool])
             
             # Combined score with slight preference for actual candidates and common words
             # Scale this as needed - currently entropy is primary factor
-            adjusted_entropy = entropy + (0.01 if is_possible_answer else 0) + (0.001 * frequency)
+            adjusted_entropy = entropies + np.where(is_possible_answer, 0.01, 0) + (0.001 * frequency)
             
-            if adjusted_entropy > best_entropy:
-                best_entropy = adjusted_entropy
-                best_guess = candidate
+            # argmax keeps the first of any tied best, in pool order
+            best_guess = pool[np.argmax(adjusted_entropy)]
         
         # If we somehow didn't find a valid guess, just pick the first valid candidate
         if best_guess is None or best_guess in self._tried:
-            for word in self.candidates:
+            for word in candidates:
                 if word not in self._tried:
                     best_guess = word
                     break
         
-        self._tried.append(best_guess)
+        self.guess_cache[key] = best_guess
+        self._add_tried(best_guess)
         self.last_guess = best_guess
         self.console.print(best_guess)
         return best_guess
\ No newline at end of file
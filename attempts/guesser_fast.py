@@ -1,19 +1,47 @@
 from random import choice
 import yaml
 from rich.console import Console
-import math
 from collections import Counter
+import numpy as np
+from common import YamlLoader, encode_words, encode_feedback, feedback_matrix, load_pattern_matrix
 
 USE_FREQUENCY = False  # Toggle frequency usage
 DEBUG = False  # Set to True to print debug information
 
+_DATA = None
+
+def _load():
+    """Word list and the tables derived from it, shared by every Guesser"""
+    word_list = yaml.load(open('dev_wordlist.yaml'), Loader=YamlLoader)
+    word_list_u8 = encode_words(word_list)  # (N, 5) letter codes
+    return {
+        'word_list': word_list,
+        'word_list_u8': word_list_u8,
+        'word_id': {w: i for i, w in enumerate(word_list)},
+        'pattern_matrix': load_pattern_matrix(word_list, word_list_u8),
+        'filter_cache': {},  # (guess, feedback code) -> surviving-word mask
+    }
+
+def _data():
+    """Load the shared tables on first use"""
+    global _DATA
+    if _DATA is None:
+        _DATA = _load()
+    return _DATA
+
 class Guesser:
     def __init__(self, manual, use_frequency=USE_FREQUENCY):
-        self.word_list = yaml.load(open('dev_wordlist.yaml'), Loader=yaml.FullLoader)
+        data = _data()
+        self.word_list = data['word_list']
+        self.word_list_u8 = data['word_list_u8']
+        self.word_id = data['word_id']
+        self.pattern_matrix = data['pattern_matrix']
+        self.filter_cache = data['filter_cache']
         self._manual = manual 
         self.console = Console()
         self._tried = []  # List of words already guessed in the current game
-        self.candidates = self.word_list.copy()  # All words are initially candidates
+        self.cand_mask = np.ones(len(self.word_list), dtype=bool)  # All words are initially candidates
+        self._tried_mask = np.zeros(len(self.word_list), dtype=bool)  # Same guesses, as a mask over word_list
         self.last_guess = None
         self.use_frequency = use_frequency
         self.dummy_used = False
@@ -32,27 +60,25 @@ class Guesser:
 
     def restart_game(self):
         self._tried = []
-        self.candidates = self.word_list.copy()
+        self.cand_mask[:] = True
+        self._tried_mask[:] = False
         self.last_guess = None
         self.dummy_used = False
 
-    def get_feedback(self, guess, answer):  # Feedback mechanism from wordle.py
-        counts = Counter(answer)
-        feedback = [''] * len(guess)
-        # First pass: assign correct-position letters.
-        for i, letter in enumerate(guess):
-            if letter == answer[i]:
-                feedback[i] = letter
-                counts[letter] -= 1
-            else:
-                feedback[i] = '+'
-        # Second pass: assign '-' for misplaced letters.
-        for i, letter in enumerate(guess):
-            if letter != answer[i] and letter in answer and counts[letter] > 0:
-                feedback[i] = '-'
-                counts[letter] -= 1
-        return ''.join(feedback)
-    
+    def feedback_row(self, guess):
+        """Feedback codes of a guess against every word in the list"""
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess]]
+        return feedback_matrix(encode_words([guess]), self.word_list_u8)[0]
+
+    def filter_mask(self, guess, code):
+        """Words giving this feedback code to the guess, cached across games
+        (the first guess is the same every game, so its masks are hit every time)"""
+        key = (guess, code)
+        if key not in self.filter_cache:
+            self.filter_cache[key] = self.feedback_row(guess) == code
+        return self.filter_cache[key]
+
     def try_dummy_guess(self, candidates_to_consider, result):
         if result.count('+') <= 2 and result.count('-') == 0 and not self.dummy_used and len(self._tried) < 5:
             pos = result.index('+')
@@ -70,31 +96,37 @@ class Guesser:
             return dummy_letters
         return None
 
+    def _add_tried(self, word):
+        """Record a guess in both the tried list and the tried mask"""
+        self._tried.append(word)
+        if word in self.word_id:  # Dummy guesses may fall outside the word list
+            self._tried_mask[self.word_id[word]] = True
+
     def get_guess(self, result):
         if self._manual == 'manual':
             return self.console.input('Your guess:\n')
         else: # Update candidates based on feedback from the previous guess.
             if self.last_guess is not None:
-                self.candidates = [word for word in self.candidates 
-                                   if self.get_feedback(self.last_guess, word) == result]
-            if not self.candidates:
-                self.candidates = self.word_list.copy()
+                self.cand_mask &= self.filter_mask(self.last_guess, encode_feedback(result))
+            if not self.cand_mask.any():
+                self.cand_mask[:] = True
         
             # Exclude words that have already been tried.
-            candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-            if not candidates_to_consider:
-                candidates_to_consider = self.candidates
-            # If only one candidate remains, choose it.
-            if len(candidates_to_consider) == 1:
+            cons_idx = np.flatnonzero(self.cand_mask & ~self._tried_mask)
+            if not len(cons_idx):
+                cons_idx = np.flatnonzero(self.cand_mask)
+            candidates_to_consider = [self.word_list[i] for i in cons_idx]
+            # With one or two candidates left, guessing the first is as good as any entropy pick.
+            if len(candidates_to_consider) <= 2:
                 guess = candidates_to_consider[0]
-                self._tried.append(guess)
+                self._add_tried(guess)
                 self.console.print(guess)
                 self.last_guess = guess
                 return guess
             # For the very first guess, use a fixed starting word.
             if self.last_guess is None:
                 guess = "tales"
-                self._tried.append(guess)
+                self._add_tried(guess)
                 self.console.print(guess)
                 self.last_guess = guess
                 return guess
@@ -102,7 +134,7 @@ class Guesser:
             # --- Special Dummy Guess for Single-Letter Ambiguity ---
             dummy_guess = self.try_dummy_guess(candidates_to_consider, result)
             if dummy_guess is not None:
-                self._tried.append(dummy_guess)
+                self._add_tried(dummy_guess)
                 self.console.print("Dummy guess:", dummy_guess)
                 self.last_guess = dummy_guess
                 return dummy_guess
@@ -130,30 +162,24 @@ class Guesser:
                     self.console.print("Top 5 words by letter-frequency score:", sorted_scores[:5])
                 guess = best_guess
             else:
-                best_entropy = -1
-                best_guess = None
                 total_weight = (sum(self.freq.get(word, 1) for word in candidates_to_consider)
                                 if self.use_frequency else len(candidates_to_consider))
-                entropies = []
-                for candidate in candidates_to_consider:
-                    distribution = {}
-                    for answer in candidates_to_consider:
-                        pattern = self.get_feedback(candidate, answer)
-                        weight = self.freq.get(answer, 1) if self.use_frequency else 1
-                        distribution[pattern] = distribution.get(pattern, 0) + weight
-                    entropy = 0
-                    for count in distribution.values():
-                        p = count / total_weight
-                        entropy -= p * math.log2(p)
-                    entropies.append((candidate, entropy))
-                    if entropy > best_entropy:
-                        best_entropy = entropy
-                        best_guess = candidate
+                weights = ([self.freq.get(word, 1) for word in candidates_to_consider]
+                           if self.use_frequency else None)
+                # Histogram of feedback codes for every candidate at once,
+                # each guess row offset into its own block of 243 bins
+                n = len(cons_idx)
+                sub = self.pattern_matrix[np.ix_(cons_idx, cons_idx)]
+                flat = (sub + 243 * np.arange(n)[:, None]).ravel()
+                w = np.tile(weights, n) if weights is not None else None
+                counts = np.bincount(flat, weights=w, minlength=243 * n).reshape(n, 243)
+                p = counts / total_weight
+                entropies = -(p * np.log2(p, where=p > 0, out=np.zeros_like(p))).sum(axis=1)
                 if DEBUG:
-                    sorted_entropies = sorted(entropies, key=lambda x: x[1], reverse=True)
-                    self.console.print("Top 5 words by entropy:", sorted_entropies[:2])
-                guess = best_guess
-            self._tried.append(guess)
+                    top = np.argsort(-entropies, kind='stable')[:2]
+                    self.console.print("Top 5 words by entropy:", [(candidates_to_consider[i], entropies[i]) for i in top])
+                guess = candidates_to_consider[entropies.argmax()]
+            self._add_tried(guess)
             self.console.print(guess)
             self.last_guess = guess
         return guess
\ No newline at end of file
@@ -1,34 +1,55 @@
+import os
+import json
+import hashlib
+import tempfile
 from random import choice
 import yaml
 from rich.console import Console
 import math
-from collections import Counter
-from functools import lru_cache
+import numpy as np
+from numba import njit, prange
+from common import YamlLoader, encode_words, encode_feedback, feedback_code, feedback_matrix, load_pattern_matrix
 
-# Use lru_cache to speed up repeated feedback calculations.
-@lru_cache(maxsize=None)
-def compute_feedback(guess, answer):
-    """
-    Compute the Wordle feedback string for a given guess and answer.
-    Letters in the correct position appear as themselves.
-    Letters in the word but in the wrong position are marked with '-',
-    and letters not in the answer are marked with '+'.
-    """
-    counts = Counter(answer)
-    feedback = [''] * len(guess)
-    # First pass: mark correct positions
-    for i, letter in enumerate(guess):
-        if letter == answer[i]:
-            feedback[i] = letter
-            counts[letter] -= 1
-        else:
-            feedback[i] = '+'
-    # Second pass: mark letters in the word but in wrong positions
-    for i, letter in enumerate(guess):
-        if letter != answer[i] and letter in answer and counts[letter] > 0:
-            feedback[i] = '-'
-            counts[letter] -= 1
-    return ''.join(feedback)
+@njit(cache=True, parallel=True)
+def guess_entropies(guesses_u8, answers_u8):
+    """Entropy of the feedback distribution of every guess over the answers, guesses spread across cores"""
+    n = len(answers_u8)
+    entropies = np.zeros(len(guesses_u8))
+    for k in prange(len(guesses_u8)):
+        counts = np.zeros(243, np.int64)
+        left = np.zeros(26, np.int8)
+        for j in range(n):
+            counts[feedback_code(guesses_u8[k], answers_u8[j], left)] += 1
+        entropy = 0.0
+        for c in counts:
+            if c > 0:
+                p = c / n
+                entropy -= p * math.log2(p)
+        entropies[k] = entropy
+    return entropies
+
+_DATA = None
+
+def _load():
+    """Guess and answer lists and the tables derived from them, shared by every auto-mode Guesser"""
+    allowed_guesses = yaml.load(open('r_wordlist.yaml'), Loader=YamlLoader)
+    possible_answers = yaml.load(open('r_wordlist.yaml'), Loader=YamlLoader)
+    possible_answers_u8 = encode_words(possible_answers)  # (N, 5) letter codes
+    return {
+        'allowed_guesses': allowed_guesses,
+        'possible_answers': possible_answers,
+        'possible_answers_u8': possible_answers_u8,
+        'answer_id': {w: i for i, w in enumerate(possible_answers)},
+        'pattern_matrix': load_pattern_matrix(possible_answers, possible_answers_u8),
+        'filter_cache': {},  # (guess, feedback code) -> surviving-word mask
+    }
+
+def _data():
+    """Load the shared tables on first use"""
+    global _DATA
+    if _DATA is None:
+        _DATA = _load()
+    return _DATA
 
 class Guesser:
     def __init__(self, manual):
@@ -37,48 +58,75 @@ class Guesser:
         self._tried = []
         if self._manual == 'manual':
             # In manual mode, use the allowed guesses list (but no auto logic is needed)
-            self.allowed_guesses = yaml.load(open('dev_wordlist.yaml'), Loader=yaml.FullLoader)
+            self.allowed_guesses = yaml.load(open('dev_wordlist.yaml'), Loader=YamlLoader)
             self.possible_answers = None
             self.best_first_guess = None
         else:
             # In auto mode, load both the training word list (allowed guesses) and the dev set (possible answers)
-            self.allowed_guesses = yaml.load(open('r_wordlist.yaml'), Loader=yaml.FullLoader)
-            self.possible_answers = yaml.load(open('r_wordlist.yaml'), Loader=yaml.FullLoader)
+            data = _data()
+            self.allowed_guesses = data['allowed_guesses']
+            self.possible_answers = data['possible_answers']
+            self.possible_answers_u8 = data['possible_answers_u8']
+            self.answer_id = data['answer_id']
+            self.pattern_matrix = data['pattern_matrix']
+            self.filter_cache = data['filter_cache']
             # Candidates are initialized as all possible answers.
-            self.candidates = self.possible_answers.copy()
+            self.cand_mask = np.ones(len(self.possible_answers), dtype=bool)
+            self._tried_mask = np.zeros(len(self.possible_answers), dtype=bool)  # Tried guesses among the answers
             self.last_guess = None
             # Precompute the best first guess over all allowed guesses
-            self.best_first_guess = self.compute_best_first_guess()
+            if 'best_first_guess' not in data:
+                data['best_first_guess'] = self.compute_best_first_guess()
+            self.best_first_guess = data['best_first_guess']
 
     def restart_game(self):
         self._tried = []
         if self._manual != 'manual':
-            self.candidates = self.possible_answers.copy()
+            self.cand_mask[:] = True
+            self._tried_mask[:] = False
             self.last_guess = None
 
+    def feedback_row(self, guess):
+        """Feedback codes of a guess against every possible answer"""
+        if guess in self.answer_id:
+            return self.pattern_matrix[self.answer_id[guess]]
+        return feedback_matrix(encode_words([guess]), self.possible_answers_u8)[0]
+
+    def filter_mask(self, guess, code):
+        """Words giving this feedback code to the guess, cached across games
+        (the first guess is the same every game, so its masks are hit every time)"""
+        key = (guess, code)
+        if key not in self.filter_cache:
+            self.filter_cache[key] = self.feedback_row(guess) == code
+        return self.filter_cache[key]
+
     def compute_best_first_guess(self):
         """
         Compute the allowed guess (even if not a possible answer) that maximizes
         the expected information (entropy) over all possible answers.
         """
-        best_entropy = -1
-        best_guess = None
-        total_answers = len(self.possible_answers)
-        for guess in self.allowed_guesses:
-            distribution = {}
-            for answer in self.possible_answers:
-                pattern = compute_feedback(guess, answer)
-                distribution[pattern] = distribution.get(pattern, 0) + 1
-            # Compute the entropy for this guess.
-            entropy = 0
-            for count in distribution.values():
-                p = count / total_answers
-                entropy -= p * math.log2(p)
-            if entropy > best_entropy:
-                best_entropy = entropy
-                best_guess = guess
+        # Only depends on the two lists, so keep it on disk and skip loading the kernel next time
+        h = hashlib.md5((','.join(self.allowed_guesses) + '|' + ','.join(self.possible_answers)).encode()).hexdigest()[:8]
+        path = os.path.join('.cache', f'best_first_guess_{h}.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)['word']
+        entropies = guess_entropies(encode_words(self.allowed_guesses), self.possible_answers_u8)
+        best_guess = self.allowed_guesses[entropies.argmax()]
+        os.makedirs('.cache', exist_ok=True)
+        # Renamed into place once complete, like the pattern matrix
+        fd, tmp = tempfile.mkstemp(dir='.cache', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'word': best_guess}, f)
+        os.replace(tmp, path)
         return best_guess
 
+    def _add_tried(self, word):
+        """Record a guess in both the tried list and the tried mask"""
+        self._tried.append(word)
+        if word in self.answer_id:  # The first guess may not be a possible answer
+            self._tried_mask[self.answer_id[word]] = True
+
     def get_guess(self, result):
         if self._manual == 'manual':
             return self.console.input('Your guess:\n')
@@ -86,45 +134,37 @@ class Guesser:
             # For the first guess, use the precomputed best first guess.
             if self.last_guess is None:
                 guess = self.best_first_guess
-                self._tried.append(guess)
+                self._add_tried(guess)
                 self.console.print(guess)
                 self.last_guess = guess
                 return guess
             else:
                 # Update candidates based on feedback from the previous guess.
-                self.candidates = [word for word in self.candidates 
-                                   if compute_feedback(self.last_guess, word) == result]
-                if not self.candidates:
-                    self.candidates = self.possible_answers.copy()
+                self.cand_mask &= self.filter_mask(self.last_guess, encode_feedback(result))
+                if not self.cand_mask.any():
+                    self.cand_mask[:] = True
                 # Only consider words that have not already been tried.
-                candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-                if not candidates_to_consider:
-                    candidates_to_consider = self.candidates
-                # If only one candidate remains, choose it.
-                if len(candidates_to_consider) == 1:
+                cons_idx = np.flatnonzero(self.cand_mask & ~self._tried_mask)
+                if not len(cons_idx):
+                    cons_idx = np.flatnonzero(self.cand_mask)
+                candidates_to_consider = [self.possible_answers[i] for i in cons_idx]
+                # With one or two candidates left, guessing the first is as good as any entropy pick.
+                if len(candidates_to_consider) <= 2:
                     guess = candidates_to_consider[0]
-                    self._tried.append(guess)
+                    self._add_tried(guess)
                     self.console.print(guess)
                     self.last_guess = guess
                     return guess
                 # Otherwise, select the candidate with the maximum expected entropy.
-                best_entropy = -1
-                best_guess = None
-                total_weight = len(candidates_to_consider)
-                for candidate in candidates_to_consider:
-                    distribution = {}
-                    for answer in candidates_to_consider:
-                        pattern = compute_feedback(candidate, answer)
-                        distribution[pattern] = distribution.get(pattern, 0) + 1
-                    entropy = 0
-                    for count in distribution.values():
-                        p = count / total_weight
-                        entropy -= p * math.log2(p)
-                    if entropy > best_entropy:
-                        best_entropy = entropy
-                        best_guess = candidate
-                guess = best_guess
-                self._tried.append(guess)
+                # One bincount over all rows, each guess offset into its own block of 243 bins
+                n = len(cons_idx)
+                sub = self.pattern_matrix[np.ix_(cons_idx, cons_idx)]
+                flat = (sub + 243 * np.arange(n)[:, None]).ravel()
+                counts = np.bincount(flat, minlength=243 * n).reshape(n, 243)
+                p = counts / n
+                entropies = -(p * np.log2(p, where=p > 0, out=np.zeros_like(p))).sum(axis=1)
+                guess = candidates_to_consider[entropies.argmax()]
+                self._add_tried(guess)
                 self.console.print(guess)
                 self.last_guess = guess
                 return guess
@@ -1,72 +1,106 @@
+import os
+import json
+import hashlib
+import tempfile
 from random import choice
 import yaml
 from rich.console import Console
-import math
-from collections import Counter
-from functools import lru_cache
+import numpy as np
+from common import YamlLoader, encode_words, encode_feedback, feedback_matrix, load_pattern_matrix
+
+_DATA = None
+
+def _load():
+    """Word list and the tables derived from it, shared by every Guesser"""
+    word_list = yaml.load(open('r_wordlist.yaml'), Loader=YamlLoader)
+    word_list_u8 = encode_words(word_list)  # (N, 5) letter codes
+    return {
+        'word_list': word_list,
+        'word_list_u8': word_list_u8,
+        'word_id': {w: i for i, w in enumerate(word_list)},
+        'pattern_matrix': load_pattern_matrix(word_list, word_list_u8),
+        'filter_cache': {},  # (guess, feedback code) -> surviving-word mask
+    }
+
+def _data():
+    """Load the shared tables on first use"""
+    global _DATA
+    if _DATA is None:
+        _DATA = _load()
+    return _DATA
 
 class Guesser:
     def __init__(self, manual):
-        # Use the revised wordlist (r_wordlist.yaml)
-        self.word_list = yaml.load(open('r_wordlist.yaml'), Loader=yaml.FullLoader)
+        # Use the revised wordlist (r_wordlist.yaml), loaded once per process
+        data = _data()
+        self.word_list = data['word_list']
+        self.word_list_u8 = data['word_list_u8']
+        self.word_id = data['word_id']
+        self.pattern_matrix = data['pattern_matrix']
+        self.filter_cache = data['filter_cache']
         self._manual = manual 
         self.console = Console()
         self._tried = []  # Words already guessed this game
-        self.candidates = self.word_list.copy()  # All words are initially candidates
+        self.cand_mask = np.ones(len(self.word_list), dtype=bool)  # All words are initially candidates
+        self._tried_mask = np.zeros(len(self.word_list), dtype=bool)  # Same guesses, as a mask over word_list
         self.last_guess = None
-        self.best_first_word = self.calculate_best_first_word()
+        # The first word is worked out once per word list (see calculate_best_first_word) and shared
+        if 'best_first_word' not in data:
+            data['best_first_word'] = self.calculate_best_first_word()
+        self.best_first_word = data['best_first_word']
         
     def restart_game(self):
         self._tried = []
-        self.candidates = self.word_list.copy()
+        self.cand_mask[:] = True
+        self._tried_mask[:] = False
         self.last_guess = None
 
-    @lru_cache(maxsize=1000000)
-    def get_feedback(self, guess, answer):
-        """Calculate feedback pattern using memoization."""
-        counts = Counter(answer)
-        feedback = [''] * len(guess)
-        
-        # First pass: mark correct positions
-        for i, letter in enumerate(guess):
-            if letter == answer[i]:
-                feedback[i] = letter
-                counts[letter] -= 1
-            else:
-                feedback[i] = '+'
-                
-        # Second pass: mark letters that are present but misplaced
-        for i, letter in enumerate(guess):
-            if feedback[i] == '+' and letter in answer and counts[letter] > 0:
-                feedback[i] = '-'
-                counts[letter] -= 1
-                
-        return ''.join(feedback)
-    
-    @lru_cache(maxsize=10000)
-    def calculate_pattern_distribution(self, guess, candidates_tuple):
+    def feedback_row(self, guess):
+        """Feedback codes of a guess (possibly not in the list) against every word in the list"""
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess]]
+        return feedback_matrix(encode_words([guess]), self.word_list_u8)[0]
+
+    def filter_mask(self, guess, code):
+        """Words giving this feedback code to the guess, cached across games
+        (the first guess is the same every game, so its masks are hit every time)"""
+        key = (guess, code)
+        if key not in self.filter_cache:
+            self.filter_cache[key] = self.feedback_row(guess) == code
+        return self.filter_cache[key]
+
+    def calculate_pattern_distribution(self, guess, cand_idx):
         """Calculate pattern distribution for a given guess and candidate set."""
-        distribution = {}
-        for answer in candidates_tuple:
-            pattern = self.get_feedback(guess, answer)
-            distribution[pattern] = distribution.get(pattern, 0) + 1
-        return distribution
+        # Not cached: the candidate set changes every turn, and list words are matrix rows already
+        return np.bincount(self.feedback_row(guess)[cand_idx], minlength=243)
     
     def calculate_entropy(self, guess, candidates):
         """Calculate entropy for a given guess against the candidate set."""
-        # Avoid converting repeatedly if already a tuple.
-        if not isinstance(candidates, tuple):
-            candidates = tuple(candidates)
         total_weight = len(candidates)
         distribution = self.calculate_pattern_distribution(guess, candidates)
-        entropy = 0
-        for count in distribution.values():
-            p = count / total_weight
-            entropy -= p * math.log2(p)
-        return entropy
+        p = distribution[distribution > 0] / total_weight
+        return -(p * np.log2(p)).sum()
+    
+    def calculate_entropies(self, guess_idx, cand_idx):
+        """Calculate entropy for several list words at once from one 2D histogram."""
+        # Each guess row is offset into its own block of 243 bins
+        n = len(guess_idx)
+        sub = self.pattern_matrix[np.ix_(guess_idx, cand_idx)]
+        flat = (sub + 243 * np.arange(n)[:, None]).ravel()
+        counts = np.bincount(flat, minlength=243 * n).reshape(n, 243)
+        p = counts / len(cand_idx)
+        return -(p * np.log2(p, where=p > 0, out=np.zeros_like(p))).sum(axis=1)
     
     def calculate_best_first_word(self):
         """Calculate the optimal first word (even if non-dictionary) based on entropy over all answers."""
+        # Kept on disk next to the pattern matrix. The pool includes choice samples of the list, so the cached word
+        # is one frozen random draw per word list; delete the file to draw again
+        h = hashlib.md5(','.join(self.word_list).encode()).hexdigest()[:8]
+        path = os.path.join('.cache', f'best_first_p3_{h}.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)['word']
+
         candidates = self.word_list.copy()
         
         # Known good starting words
@@ -90,61 +124,74 @@ class Guesser:
                                         potential_first_words.append(c1 + v1 + c2 + v2 + c3)
         
         # Limit to a maximum of 1000 candidates.
+        # Random samples repeat and may overlap the known words, so drop duplicates
+        # (keeping the first occurrence) and words with fewer than 4 distinct letters
+        potential_first_words = [w for w in dict.fromkeys(potential_first_words) if len(set(w)) >= 4]
         potential_first_words = potential_first_words[:1000]
         
         best_word = None
         best_entropy = -1
         # For performance, use the full candidate set for evaluation.
-        candidate_sample = candidates
+        candidate_sample = np.arange(len(candidates))
         
         for word in potential_first_words:
             entropy = self.calculate_entropy(word, candidate_sample)
             if entropy > best_entropy:
                 best_entropy = entropy
                 best_word = word
+        os.makedirs('.cache', exist_ok=True)
+        # Renamed into place once complete, like the pattern matrix
+        fd, tmp = tempfile.mkstemp(dir='.cache', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'word': best_word}, f)
+        os.replace(tmp, path)
         return best_word
     
+    def _add_tried(self, word):
+        """Record a guess in both the tried list and the tried mask"""
+        self._tried.append(word)
+        if word in self.word_id:  # The first word may be synthetic
+            self._tried_mask[self.word_id[word]] = True
+
     def get_guess(self, result):
         if self._manual == 'manual':
             return self.console.input('Your guess:\n')
         else:
             # Update candidates based on feedback from the previous guess.
             if self.last_guess is not None:
-                self.candidates = [word for word in self.candidates 
-                                   if self.get_feedback(self.last_guess, word) == result]
+                self.cand_mask &= self.filter_mask(self.last_guess, encode_feedback(result))
             
             # For the first guess, return the precomputed best first word.
             if not self._tried:
                 guess = self.best_first_word
-                self._tried.append(guess)
+                self._add_tried(guess)
                 self.console.print(guess)
                 self.last_guess = guess
                 return guess
             
-            # If only one candidate remains, return it.
-            if len(self.candidates) == 1:
-                guess = self.candidates[0]
-                self._tried.append(guess)
+            cand_idx = np.flatnonzero(self.cand_mask)
+            # With one or two candidates left, guess the first (a 50/50 either way).
+            if 1 <= len(cand_idx) <= 2:
+                guess = self.word_list[cand_idx[0]]
+                self._add_tried(guess)
                 self.console.print(guess)
                 self.last_guess = guess
                 return guess
             
             # If no candidates remain (should not happen), reset the candidate list.
-            if not self.candidates:
-                self.candidates = [w for w in self.word_list if w not in self._tried]
+            if not len(cand_idx):
+                self.cand_mask = ~self._tried_mask
+                cand_idx = np.flatnonzero(self.cand_mask)
             
             # For subsequent guesses, select the candidate with the highest entropy.
-            candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-            if not candidates_to_consider:
-                candidates_to_consider = self.candidates
-            
-            # Precompute the tuple version of candidates for efficiency.
-            candidates_tuple = tuple(self.candidates)
-            best_guess = max(candidates_to_consider, 
-                             key=lambda candidate: self.calculate_entropy(candidate, candidates_tuple))
+            cons_idx = np.flatnonzero(self.cand_mask & ~self._tried_mask)
+            if not len(cons_idx):
+                cons_idx = cand_idx
+            candidates_to_consider = [self.word_list[i] for i in cons_idx]
             
-            guess = best_guess
-            self._tried.append(guess)
+            entropies = self.calculate_entropies(cons_idx, cand_idx)
+            guess = candidates_to_consider[entropies.argmax()]
+            self._add_tried(guess)
             self.console.print(guess)
             self.last_guess = guess
             return guess
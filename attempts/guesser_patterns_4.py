@@ -1,76 +1,97 @@
+import os
+import json
+import hashlib
+import tempfile
 from random import choice, sample
 import yaml
 from rich.console import Console
-import math
 from collections import Counter
-from functools import lru_cache
+from itertools import product
+import numpy as np
+from common import YamlLoader, encode_words, encode_feedback, feedback_matrix, load_pattern_matrix, nlogn_table, pattern_entropies
+
+_DATA = None
+
+def _load():
+    """Word list and the tables derived from it, shared by every Guesser"""
+    word_list = yaml.load(open('dev_wordlist.yaml'), Loader=YamlLoader)
+    word_list_u8 = encode_words(word_list)  # (N, 5) letter codes
+    return {
+        'word_list': word_list,
+        'word_list_u8': word_list_u8,
+        'word_id': {w: i for i, w in enumerate(word_list)},
+        'pattern_matrix': load_pattern_matrix(word_list, word_list_u8),
+        'filter_cache': {},  # (guess, feedback code) -> surviving-word mask
+        'nlogn': nlogn_table(len(word_list)),
+    }
+
+def _data():
+    """Load the shared tables on first use"""
+    global _DATA
+    if _DATA is None:
+        _DATA = _load()
+    return _DATA
 
 class Guesser:
     def __init__(self, manual):
-        self.word_list = yaml.load(open('dev_wordlist.yaml'), Loader=yaml.FullLoader)
+        # Loaded once per process and shared by every Guesser
+        data = _data()
+        self.word_list = data['word_list']
+        self.word_list_u8 = data['word_list_u8']
+        self.word_id = data['word_id']
+        self.pattern_matrix = data['pattern_matrix']
+        self.filter_cache = data['filter_cache']
+        self.nlogn = data['nlogn']
         self._manual = manual 
         self.console = Console()
+        # Rich is only worth its markup handling when a person is playing
+        self._print = self.console.print if manual == 'manual' else print
         self._tried = []  # Words already guessed this game
-        self.candidates = self.word_list.copy()  # All words are initially candidates
+        self.cand_mask = np.ones(len(self.word_list), dtype=bool)  # All words are initially candidates
+        self._tried_mask = np.zeros(len(self.word_list), dtype=bool)  # Same guesses, as a mask over word_list
         self.last_guess = None
 
         # Hard-code known excellent first words that have been empirically verified
         # Including "saren" which was identified in previous successful versions
         self.excellent_openers = ["saren", "soare", "roate", "raise", "slate", "crate", "adieu", "stare", "slant", "tares"]
         
-        # Pre-compute best first word
-        self.best_first_word = self._calculate_best_first_word()
+        # Pre-compute best first word, once per process
+        if 'best_first_word' not in data:
+            data['best_first_word'] = self._calculate_best_first_word()
+        self.best_first_word = data['best_first_word']
         
     def restart_game(self):
         self._tried = []
-        self.candidates = self.word_list.copy()
+        self.cand_mask[:] = True
+        self._tried_mask[:] = False
         self.last_guess = None
         
-    @lru_cache(maxsize=None)
-    def get_feedback(self, guess, answer):
-        """Calculate feedback pattern with optimized implementation"""
-        # Fast path for exact match
-        if guess == answer:
-            return guess
-            
-        counts = Counter(answer)
-        feedback = ['+'] * len(guess)  # Initialize all positions as not in word
-        
-        # First pass: mark correct positions
-        for i, letter in enumerate(guess):
-            if letter == answer[i]:
-                feedback[i] = letter
-                counts[letter] -= 1
-                
-        # Second pass: mark letters that are present but misplaced
-        for i, letter in enumerate(guess):
-            if feedback[i] == '+' and letter in answer and counts[letter] > 0:
-                feedback[i] = '-'
-                counts[letter] -= 1
-                
-        return ''.join(feedback)
-    
-    @lru_cache(maxsize=100000)
-    def _calculate_pattern_distribution(self, guess, candidates_tuple):
-        """Calculate pattern distribution with aggressive caching"""
-        distribution = {}
-        for answer in candidates_tuple:
-            pattern = self.get_feedback(guess, answer)
-            distribution[pattern] = distribution.get(pattern, 0) + 1
-        return distribution
+    def feedback_row(self, guess):
+        """Feedback codes of a guess (possibly not in the list) against every word in the list"""
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess]]
+        return feedback_matrix(encode_words([guess]), self.word_list_u8)[0]
+
+    def filter_mask(self, guess, code):
+        """Words giving this feedback code to the guess, cached across games
+        (the first guess is the same every game, so its masks are hit every time)"""
+        key = (guess, code)
+        if key not in self.filter_cache:
+            self.filter_cache[key] = self.feedback_row(guess) == code
+        return self.filter_cache[key]
+
+    def _calculate_pattern_distribution(self, guess, cand_idx):
+        """Calculate pattern distribution from the guess's feedback row"""
+        # Not cached: the candidate set changes every turn, and list words are matrix rows already
+        return np.bincount(self.feedback_row(guess)[cand_idx], minlength=243)
     
-    def _calculate_entropy(self, guess, candidates_tuple):
+    def _calculate_entropy(self, guess, cand_idx):
         """Calculate entropy with optimized implementation"""
-        total_candidates = len(candidates_tuple)
-        distribution = self._calculate_pattern_distribution(guess, candidates_tuple)
-        
-        # Entropy calculation
-        entropy = 0
-        for count in distribution.values():
-            p = count / total_candidates
-            entropy -= p * math.log2(p)
-            
-        return entropy
+        total_candidates = len(cand_idx)
+        distribution = self._calculate_pattern_distribution(guess, cand_idx)
+        
+        # Entropy from the bin counts, with c * log2(c) looked up per count
+        return np.log2(total_candidates) - self.nlogn[distribution].sum() / total_candidates
     
     def _generate_high_value_words(self):
         """Generate words specifically designed to maximize information gain"""
@@ -89,24 +110,13 @@ class Guesser:
         # Ensure unique letters for maximum information
         high_value_words = []
         
-        # Generate words with strategic letter placements
-        for v1 in vowels[:3]:
-            for v2 in vowels[:3]:
-                if v1 == v2:
-                    continue
-                for c1 in consonants[:5]:
-                    for c2 in consonants[:5]:
-                        if c1 == c2:
-                            continue
-                        for c3 in consonants[:5]:
-                            if c3 in [c1, c2]:
-                                continue
-                            # Create words with common patterns (CVCVC, CVCCV)
-                            word1 = c1 + v1 + c2 + v2 + c3  # CVCVC
-                            word2 = c1 + v1 + c2 + c3 + v2  # CVCCV
-                            
-                            high_value_words.append(word1)
-                            high_value_words.append(word2)
+        # Generate words with strategic letter placements, all five letters distinct
+        for v1, v2, c1, c2, c3 in product(vowels[:3], vowels[:3], consonants[:5], consonants[:5], consonants[:5]):
+            if len({v1, v2, c1, c2, c3}) < 5:
+                continue
+            # Create words with common patterns (CVCVC, CVCCV)
+            high_value_words.append(''.join((c1, v1, c2, v2, c3)))  # CVCVC
+            high_value_words.append(''.join((c1, v1, c2, c3, v2)))  # CVCCV
         
         # Add our known excellent openers
         high_value_words.extend(self.excellent_openers)
@@ -114,45 +124,51 @@ class Guesser:
         # Add a sample from the wordlist
         high_value_words.extend(sample(self.word_list, min(200, len(self.word_list))))
         
-        return high_value_words
+        # Drop repeats (an opener or sampled word may also be generated), keeping the first one
+        return list(dict.fromkeys(high_value_words))
     
     def _calculate_best_first_word(self):
         """Calculate optimal first word with improved algorithm"""
-        # Use the full wordlist as the evaluation set for maximum accuracy
-        answers_tuple = tuple(self.word_list)
-        
-        # First check if "saren" is better than other known good openers
-        best_entropy = 0
-        best_word = "saren"  # Start with known good opener
-        
-        # Check entropy for known good openers first
-        for word in self.excellent_openers:
-            entropy = self._calculate_entropy(word, answers_tuple)
-            if entropy > best_entropy:
-                best_entropy = entropy
-                best_word = word
-                
+        # Kept on disk next to the pattern matrix. The pool includes a random sample of the generated words, so the cached word
+        # is one frozen random draw per word list; delete the file to draw again
+        h = hashlib.md5(','.join(self.word_list).encode()).hexdigest()[:8]
+        path = os.path.join('.cache', f'best_first_p4_{h}.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)['word']
+
         # Generate additional candidate words
         potential_words = self._generate_high_value_words()
         
         # Evaluate a reasonable subset for efficiency
         evaluation_candidates = sample(potential_words, min(300, len(potential_words)))
         
-        # Find the best word by entropy
-        for word in evaluation_candidates:
-            entropy = self._calculate_entropy(word, answers_tuple)
-            
-            # Prefer words with unique letters (better information gain)
-            unique_letter_count = len(set(word))
-            if unique_letter_count == 5:  # All letters are unique
-                entropy += 0.01  # Small bonus
-                
-            if entropy > best_entropy:
-                best_entropy = entropy
-                best_word = word
+        # Known good openers first, then the sample, all scored against the full wordlist in one pass
+        openers = self.excellent_openers + evaluation_candidates
+        entropies = pattern_entropies(feedback_matrix(encode_words(openers), self.word_list_u8), self.nlogn)
+        
+        # Prefer sampled words with unique letters (better information gain)
+        n_known = len(self.excellent_openers)
+        entropies[n_known:] += 0.01 * np.array([len(set(w)) == 5 for w in evaluation_candidates])
         
+        # First best wins ties, and "saren" stays unless something has positive entropy
+        best = entropies.argmax()
+        best_word = openers[best] if entropies[best] > 0 else "saren"
+        
+        os.makedirs('.cache', exist_ok=True)
+        # Renamed into place once complete, like the pattern matrix
+        fd, tmp = tempfile.mkstemp(dir='.cache', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'word': best_word}, f)
+        os.replace(tmp, path)
         return best_word
     
+    def _add_tried(self, word):
+        """Record a guess in both the tried list and the tried mask"""
+        self._tried.append(word)
+        if word in self.word_id:  # The opener may be synthetic
+            self._tried_mask[self.word_id[word]] = True
+
     def get_guess(self, result):
         if self._manual == 'manual':
             return self.console.input('Your guess:\n')
@@ -160,51 +176,41 @@ class Guesser:
         # First guess - use pre-computed best first word
         if not self._tried:
             guess = self.best_first_word
-            self._tried.append(guess)
-            self.console.print(guess)
+            self._add_tried(guess)
+            self._print(guess)
             self.last_guess = guess
             return guess
             
         # Update candidates based on feedback from the previous guess
         if self.last_guess is not None:
-            new_candidates = []
-            for word in self.candidates:
-                if self.get_feedback(self.last_guess, word) == result:
-                    new_candidates.append(word)
-            self.candidates = new_candidates
+            self.cand_mask &= self.filter_mask(self.last_guess, encode_feedback(result))
+        cand_idx = np.flatnonzero(self.cand_mask)
             
-        # If only one candidate remains, that must be the answer
-        if len(self.candidates) == 1:
-            guess = self.candidates[0]
-            self._tried.append(guess)
-            self.console.print(guess)
+        # With one or two candidates left, guess the first (a 50/50 either way)
+        if 1 <= len(cand_idx) <= 2:
+            guess = self.word_list[cand_idx[0]]
+            self._add_tried(guess)
+            self._print(guess)
             self.last_guess = guess
             return guess
             
         # If no candidates remain (shouldn't happen), reset
-        if not self.candidates:
-            self.candidates = [w for w in self.word_list if w not in self._tried]
+        if not len(cand_idx):
+            self.cand_mask = ~self._tried_mask
+            cand_idx = np.flatnonzero(self.cand_mask)
             
         # Only consider untried candidates
-        candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-        if not candidates_to_consider:
-            candidates_to_consider = self.candidates
+        cons_idx = np.flatnonzero(self.cand_mask & ~self._tried_mask)
+        if not len(cons_idx):
+            cons_idx = cand_idx
             
-        # Convert to tuple for caching
-        candidates_tuple = tuple(self.candidates)
-        
-        # Find the candidate with the highest entropy
-        best_entropy = -1
-        best_guess = None
-        
-        for candidate in candidates_to_consider:
-            entropy = self._calculate_entropy(candidate, candidates_tuple)
-            if entropy > best_entropy:
-                best_entropy = entropy
-                best_guess = candidate
+        # Score every remaining candidate at once on the (guesses x candidates) block of the matrix;
+        # argmax keeps the first of any tied best, as the old strict-> loop did
+        entropies = pattern_entropies(self.pattern_matrix[np.ix_(cons_idx, cand_idx)], self.nlogn)
+        best_guess = self.word_list[cons_idx[np.argmax(entropies)]]
         
         guess = best_guess
-        self._tried.append(guess)
-        self.console.print(guess)
+        self._add_tried(guess)
+        self._print(guess)
         self.last_guess = guess
         return guess
\ No newline at end of file
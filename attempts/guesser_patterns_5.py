@@ -1,70 +1,104 @@
+import os
+import json
+import hashlib
+import tempfile
 from random import choice
 import yaml
 from rich.console import Console
-import math
 from collections import Counter, defaultdict
-from functools import lru_cache
 from itertools import product
+import numpy as np
+from common import YamlLoader, encode_words, encode_feedback, feedback_matrix, load_pattern_matrix, nlogn_table, pattern_entropies
+
+_DATA = None
+
+def _load():
+    """Word list and the tables derived from it, shared by every Guesser"""
+    word_list = yaml.load(open('dev2.yaml'), Loader=YamlLoader)
+    word_list_u8 = encode_words(word_list)  # (N, 5) letter codes
+    return {
+        'word_list': word_list,
+        'word_list_u8': word_list_u8,
+        'word_id': {w: i for i, w in enumerate(word_list)},
+        'pattern_matrix': load_pattern_matrix(word_list, word_list_u8),
+        'filter_cache': {},  # (guess, feedback code) -> surviving-word mask
+        'nlogn': nlogn_table(len(word_list)),
+    }
+
+def _data():
+    """Load the shared tables on first use"""
+    global _DATA
+    if _DATA is None:
+        _DATA = _load()
+    return _DATA
 
 class Guesser:
     def __init__(self, manual):
-        self.word_list = yaml.load(open('dev2.yaml'), Loader=yaml.FullLoader)
+        # Loaded once per process and shared by every Guesser
+        data = _data()
+        self.word_list = data['word_list']
+        self.word_list_u8 = data['word_list_u8']
+        self.word_id = data['word_id']
+        self.pattern_matrix = data['pattern_matrix']
+        self.filter_cache = data['filter_cache']
+        self.nlogn = data['nlogn']
         self._manual = manual 
         self.console = Console()
+        # Rich is only worth its markup handling when a person is playing
+        self._print = self.console.print if manual == 'manual' else print
         self._tried = []
-        self.candidates = self.word_list.copy()  # All words are initially candidates
+        self.cand_mask = np.ones(len(self.word_list), dtype=bool)  # All words are initially candidates
+        self._tried_mask = np.zeros(len(self.word_list), dtype=bool)  # Same guesses, as a mask over word_list
         self.last_guess = None
-        self.best_first_word = self.best_first_guess()
+        # The first word only depends on the word list, so compute it once and share it
+        if 'best_first_word' not in data:
+            data['best_first_word'] = self.best_first_guess()
+        self.best_first_word = data['best_first_word']
         
     def restart_game(self):
         self._tried = []
-        self.candidates = self.word_list.copy()
+        self.cand_mask[:] = True
+        self._tried_mask[:] = False
         self.last_guess = None
 
-    @lru_cache(maxsize=1000000)
-    def get_feedback(self, guess, answer):
-        # Produces the feedback string just like in Wordle
-        counts = Counter(answer)
-        feedback = [''] * len(guess)
-        for i, letter in enumerate(guess):
-            if letter == answer[i]:
-                feedback[i] = letter
-                counts[letter] -= 1
-            else:
-                feedback[i] = '+'
-        for i, letter in enumerate(guess):
-            if feedback[i] == '+' and letter in answer and counts[letter] > 0:
-                feedback[i] = '-'
-                counts[letter] -= 1
-        return ''.join(feedback)
-    
-    @lru_cache(maxsize=10000)
-    def calculate_pattern_distribution(self, guess, candidates_tuple):
+    def feedback_row(self, guess):
+        """Feedback codes of a guess (possibly not in the list) against every word in the list"""
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess]]
+        return feedback_matrix(encode_words([guess]), self.word_list_u8)[0]
+
+    def filter_mask(self, guess, code):
+        """Words giving this feedback code to the guess, cached across games
+        (the first guess is the same every game, so its masks are hit every time)"""
+        key = (guess, code)
+        if key not in self.filter_cache:
+            self.filter_cache[key] = self.feedback_row(guess) == code
+        return self.filter_cache[key]
+
+    def calculate_pattern_distribution(self, guess, cand_idx):
         """Calculate pattern distribution for a given guess and candidate set."""
-        distribution = {}
-        for answer in candidates_tuple:
-            pattern = self.get_feedback(guess, answer)
-            distribution[pattern] = distribution.get(pattern, 0) + 1
-        return distribution
+        # Not cached: the candidate set changes every turn, and list words are matrix rows already
+        return np.bincount(self.feedback_row(guess)[cand_idx], minlength=243)
     
-    def calculate_entropy(self, guess, candidates):
+    def calculate_entropy(self, guess, cand_idx):
         """Calculate entropy for a given guess against the candidate set."""
-        # Avoid converting repeatedly if already a tuple.
-        if not isinstance(candidates, tuple):
-            candidates = tuple(candidates)
-        total_weight = len(candidates)
-        distribution = self.calculate_pattern_distribution(guess, candidates)
-        entropy = 0
-        for count in distribution.values():
-            p = count / total_weight
-            entropy -= p * math.log2(p)
-        return entropy
+        total_weight = len(cand_idx)
+        distribution = self.calculate_pattern_distribution(guess, cand_idx)
+        # Entropy from the bin counts, with c * log2(c) looked up per count
+        return np.log2(total_weight) - self.nlogn[distribution].sum() / total_weight
     
     def best_first_guess(self):
         """Calculate the optimal first word (which does not need to be a valid candidate) based on entropy,
         but restrict the candidate pool to words built from the most frequent letters in each position."""
+        # The result only depends on the word list, so it is kept on disk next to the pattern matrix
+        h = hashlib.md5(','.join(self.word_list).encode()).hexdigest()[:8]
+        path = os.path.join('.cache', f'best_first_p5_{h}.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)['word']
+
         pos_counters = [defaultdict(int) for _ in range(5)]
-        for word in self.candidates:
+        for word in self.word_list:
             for i, letter in enumerate(word):
                 pos_counters[i][letter] += 1
         top_letters = []
@@ -76,55 +110,64 @@ class Guesser:
         known_good = {"saren", "ranes", "saret", "tares", "earis",
                     "saner", "lares", "aires", "raise", "sarel"}
         potential_first_words |= known_good
-        best_word = None
-        best_entropy = -1
-        for word in potential_first_words:
-            entropy = self.calculate_entropy(word, self.candidates)
-            if entropy > best_entropy:
-                best_entropy = entropy
-                best_word = word
+        # Score every opener against the full list in one pass (first best wins ties)
+        potential_first_words = list(potential_first_words)
+        entropies = pattern_entropies(feedback_matrix(encode_words(potential_first_words), self.word_list_u8), self.nlogn)
+        best_word = potential_first_words[entropies.argmax()]
+        os.makedirs('.cache', exist_ok=True)
+        # Renamed into place once complete, like the pattern matrix
+        fd, tmp = tempfile.mkstemp(dir='.cache', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'word': best_word}, f)
+        os.replace(tmp, path)
         return best_word
     
+    def _add_tried(self, word):
+        """Record a guess in both the tried list and the tried mask"""
+        self._tried.append(word)
+        if word in self.word_id:  # The first word may be synthetic
+            self._tried_mask[self.word_id[word]] = True
+
     def get_guess(self, result):
         if self._manual == 'manual':
             return self.console.input('Your guess:\n')
         else:
             # Update candidates based on feedback from the previous guess.
             if self.last_guess is not None:
-                self.candidates = [word for word in self.candidates 
-                                   if self.get_feedback(self.last_guess, word) == result]
+                self.cand_mask &= self.filter_mask(self.last_guess, encode_feedback(result))
+            cand_idx = np.flatnonzero(self.cand_mask)
             
             # For the first guess, return the precomputed best first word.
             if not self._tried:
                 guess = self.best_first_word
-                self._tried.append(guess)
-                self.console.print(guess)
+                self._add_tried(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
             
-            # If only one candidate remains, return it.
-            if len(self.candidates) == 1:
-                guess = self.candidates[0]
-                self._tried.append(guess)
-                self.console.print(guess)
+            # With one or two candidates left, guess the first (a 50/50 either way)
+            if 1 <= len(cand_idx) <= 2:
+                guess = self.word_list[cand_idx[0]]
+                self._add_tried(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
             
             # If no candidates remain (should not happen), reset the candidate list.
-            if not self.candidates:
-                self.candidates = [w for w in self.word_list if w not in self._tried]
+            if not len(cand_idx):
+                self.cand_mask = ~self._tried_mask
+                cand_idx = np.flatnonzero(self.cand_mask)
             
             # For subsequent guesses, select the candidate with the highest entropy.
-            candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-            if not candidates_to_consider:
-                candidates_to_consider = self.candidates
+            cons_idx = np.flatnonzero(self.cand_mask & ~self._tried_mask)
+            if not len(cons_idx):
+                cons_idx = cand_idx
             
-            # Precompute the tuple version of candidates for efficiency.
-            candidates_tuple = tuple(self.candidates)
-            best_guess = max(candidates_to_consider, 
-                             key=lambda candidate: self.calculate_entropy(candidate, candidates_tuple))
-            guess = best_guess
-            self._tried.append(guess)
-            self.console.print(guess)
+            # Score every remaining candidate at once on the (guesses x candidates) block of the matrix;
+            # argmax keeps the first of any tied best, as the old strict-> loop did
+            entropies = pattern_entropies(self.pattern_matrix[np.ix_(cons_idx, cand_idx)], self.nlogn)
+            guess = self.word_list[cons_idx[np.argmax(entropies)]]
+            self._add_tried(guess)
+            self._print(guess)
             self.last_guess = guess
             return guess
\ No newline at end of file
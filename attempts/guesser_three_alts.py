@@ -1,58 +1,108 @@
 from random import choice
 import yaml
 from rich.console import Console
-import math
 from collections import Counter
-from functools import lru_cache
+import numpy as np
+from common import YamlLoader, encode_words, encode_feedback, feedback_matrix, load_pattern_matrix
+
+_DATA = None
+
+def _load():
+    """Word list and the tables derived from it, shared by every Guesser"""
+    word_list = yaml.load(open('r_wordlist.yaml'), Loader=YamlLoader)
+    word_list_u8 = encode_words(word_list)  # (N, 5) letter codes
+    # presence[i, k] is 1 if letter k appears (at least once) in word i
+    presence = np.zeros((len(word_list), 26), dtype=np.uint8)
+    presence[np.arange(len(word_list))[:, None], word_list_u8] = 1
+    return {
+        'word_list': word_list,
+        'word_list_u8': word_list_u8,
+        'word_id': {w: i for i, w in enumerate(word_list)},
+        'presence': presence,
+        'pattern_matrix': load_pattern_matrix(word_list, word_list_u8),
+        'filter_cache': {},  # (guess, feedback code) -> surviving-word mask
+    }
+
+def _data():
+    """Load the shared tables on first use"""
+    global _DATA
+    if _DATA is None:
+        _DATA = _load()
+    return _DATA
+
+_FREQ = None
+
+def load_frequencies():
+    """Word frequencies from wordlist.tsv, read once and shared by every Guesser"""
+    global _FREQ
+    if _FREQ is None:
+        _FREQ = {}
+        with open('wordlist.tsv') as f:
+            for line in f:
+                parts = line.strip().split('\t')
+                if len(parts) >= 2:
+                    word = parts[0]
+                    try:
+                        frequency = float(parts[1])
+                    except ValueError:
+                        frequency = 1.0
+                    _FREQ[word] = frequency
+    return _FREQ
+
+def pattern_entropy(patterns, weights, total_weight):
+    """Entropy of a batch of feedback codes, each answer counted with its weight"""
+    distribution = np.bincount(patterns, weights=weights, minlength=243)
+    p = distribution[distribution > 0] / total_weight
+    return -(p * np.log2(p)).sum()
 
 USE_FREQUENCY = False  # Toggle frequency usage
 
 class Guesser:
     def __init__(self, manual, use_frequency=USE_FREQUENCY):
-        self.word_list = yaml.load(open('r_wordlist.yaml'), Loader=yaml.FullLoader)
+        # Loaded once per process and shared by every Guesser
+        data = _data()
+        self.word_list = data['word_list']
+        self.word_list_u8 = data['word_list_u8']
+        self.word_id = data['word_id']
+        self.presence = data['presence']
+        self.pattern_matrix = data['pattern_matrix']
+        self.filter_cache = data['filter_cache']
         self._manual = manual 
         self.console = Console()
+        # Rich is only worth its markup handling when a person is playing
+        self._print = self.console.print if manual == 'manual' else print
         self._tried = []  # List of words already guessed in the current game
-        self.candidates = self.word_list.copy()  # All words are initially candidates
+        self.cand_mask = np.ones(len(self.word_list), dtype=bool)  # All words are initially candidates
+        self._tried_mask = np.zeros(len(self.word_list), dtype=bool)  # Same guesses, as a mask over word_list
         self.last_guess = None
         self.use_frequency = use_frequency
         self.dummy_used = False
         self._cached_first_words = {}  # Cache for first words by method
         
         if self.use_frequency:
-            self.freq = {}
-            with open('wordlist.tsv') as f:
-                for line in f:
-                    parts = line.strip().split('\t')
-                    if len(parts) >= 2:
-                        word = parts[0]
-                        try:
-                            frequency = float(parts[1])
-                        except ValueError:
-                            frequency = 1.0
-                        self.freq[word] = frequency
+            self.freq = load_frequencies()
 
     def restart_game(self):
         self._tried = []
-        self.candidates = self.word_list.copy()
+        self.cand_mask[:] = True
+        self._tried_mask[:] = False
         self.last_guess = None
         self.dummy_used = False
 
-    def get_feedback(self, guess, answer):
-        counts = Counter(answer)
-        feedback = [''] * len(guess)
-        for i, letter in enumerate(guess):
-            if letter == answer[i]:
-                feedback[i] = letter
-                counts[letter] -= 1
-            else:
-                feedback[i] = '+'
-        for i, letter in enumerate(guess):
-            if letter != answer[i] and letter in answer and counts[letter] > 0:
-                feedback[i] = '-'
-                counts[letter] -= 1
-        return ''.join(feedback)
+    def feedback_row(self, guess):
+        """Feedback codes of a guess (possibly not in the list) against every word in the list"""
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess]]
+        return feedback_matrix(encode_words([guess]), self.word_list_u8)[0]
     
+    def filter_mask(self, guess, code):
+        """Words giving this feedback code to the guess, cached across games
+        (the first guess is the same every game, so its masks are hit every time)"""
+        key = (guess, code)
+        if key not in self.filter_cache:
+            self.filter_cache[key] = self.feedback_row(guess) == code
+        return self.filter_cache[key]
+
     def try_dummy_guess(self, candidates_to_consider, result):
         if result.count('+') <= 1 and result.count('-') == 0 and not self.dummy_used and len(self._tried) < 5:
             pos = result.index('+')
@@ -118,19 +168,11 @@ class Guesser:
         # This improves performance as checking all words against all words is expensive
         test_candidates = candidates_to_consider[:500] if len(candidates_to_consider) > 500 else candidates_to_consider
         
-        for candidate in test_candidates:
-            # Track pattern distribution
-            distribution = {}
-            for answer in candidates_to_consider:
-                pattern = self.get_feedback(candidate, answer)
-                weight = self.freq.get(answer, 1) if self.use_frequency else 1
-                distribution[pattern] = distribution.get(pattern, 0) + weight
-            
-            # Calculate entropy
-            entropy = 0
-            for count in distribution.values():
-                p = count / total_weight
-                entropy -= p * math.log2(p)
+        weights = ([self.freq.get(word, 1) for word in candidates_to_consider]
+                   if self.use_frequency else None)
+        for i, candidate in enumerate(test_candidates):
+            # Histogram the candidate's row of feedback codes against every answer
+            entropy = pattern_entropy(self.pattern_matrix[i], weights, total_weight)
             
             if entropy > best_entropy:
                 best_entropy = entropy
@@ -140,33 +182,17 @@ class Guesser:
 
     def _first_word_positional(self):
         """Calculate best first word using positional letter frequency"""
-        # Create a positional frequency dictionary
-        positional_freq = [{} for _ in range(5)]
+        W = self.word_list_u8
+        # positional_freq[pos, letter] counts each letter at each position
+        positional_freq = np.zeros((5, 26), dtype=np.int64)
+        np.add.at(positional_freq, (np.broadcast_to(np.arange(5), W.shape), W), 1)
         
-        # Count frequency of each letter at each position
-        for word in self.word_list:
-            for pos, letter in enumerate(word):
-                positional_freq[pos][letter] = positional_freq[pos].get(letter, 0) + 1
+        # Only the first occurrence of a repeated letter counts, to avoid double-counting
+        repeat = ((W[:, :, None] == W[:, None, :]) & np.tri(5, k=-1, dtype=bool)).any(axis=2)
         
-        # Score each word based on positional letter frequency
-        best_score = -1
-        best_word = None
-        
-        for word in self.word_list:
-            # Use a set to avoid double-counting repeated letters
-            unique_letters = set()
-            score = 0
-            
-            for pos, letter in enumerate(word):
-                if letter not in unique_letters:
-                    unique_letters.add(letter)
-                    score += positional_freq[pos].get(letter, 0)
-            
-            if score > best_score:
-                best_score = score
-                best_word = word
-        
-        return best_word
+        # Score every word at once, the first best word wins ties
+        scores = (positional_freq[np.arange(5), W] * ~repeat).sum(axis=1)
+        return self.word_list[scores.argmax()]
 
     def _first_word_combo(self):
         """
@@ -209,22 +235,29 @@ class Guesser:
         
         return best_word
 
+    def _add_tried(self, word):
+        """Record a guess in both the tried list and the tried mask"""
+        self._tried.append(word)
+        if word in self.word_id:  # The fixed opener and dummy guesses may fall outside the list
+            self._tried_mask[self.word_id[word]] = True
+
     def get_guess(self, result):
         if self._manual == 'manual':
             return self.console.input('Your guess:\n')
         else: # Update candidates based on feedback from the previous guess.
             if self.last_guess is not None:
-                self.candidates = [word for word in self.candidates 
-                                  if self.get_feedback(self.last_guess, word) == result]
-            if not self.candidates:
-                self.candidates = self.word_list.copy()
-            candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-            if not candidates_to_consider:
-                candidates_to_consider = self.candidates
-            if len(candidates_to_consider) == 1:
+                self.cand_mask &= self.filter_mask(self.last_guess, encode_feedback(result))
+            if not self.cand_mask.any():
+                self.cand_mask[:] = True
+            cons_idx = np.flatnonzero(self.cand_mask & ~self._tried_mask)
+            if not len(cons_idx):
+                cons_idx = np.flatnonzero(self.cand_mask)
+            candidates_to_consider = [self.word_list[i] for i in cons_idx]
+            # With one or two candidates left, guessing the first is as good as any entropy pick.
+            if len(candidates_to_consider) <= 2:
                 guess = candidates_to_consider[0]
-                self._tried.append(guess)
-                self.console.print(guess)
+                self._add_tried(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
             if self.last_guess is None:
@@ -232,60 +265,46 @@ class Guesser:
                 # The optimal first word will be calculated once and cached
                 #guess = self.calculate_first_word(method='combo')
                 guess = 'tales'
-                self._tried.append(guess)
-                self.console.print(guess)
+                self._add_tried(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
             
             #dummy_guess = self.try_dummy_guess(candidates_to_consider, result)
             dummy_guess = None
             if dummy_guess is not None:
-                self._tried.append(dummy_guess)
-                self.console.print("Dummy guess:", dummy_guess)
+                self._add_tried(dummy_guess)
+                self._print("Dummy guess:", dummy_guess)
                 self.last_guess = dummy_guess
                 return dummy_guess
-            print(len(candidates_to_consider))
             if len(candidates_to_consider) > 50: # heuristic / entropy choice
+                presence = self.presence[cons_idx]
                 if self.use_frequency:
-                    letter_counts = {}
-                    for word in candidates_to_consider:
-                        weight = self.freq.get(word, 1)
-                        for letter in set(word):
-                            letter_counts[letter] = letter_counts.get(letter, 0) + weight
+                    # Each word adds its weight once per distinct letter
+                    weights = np.array([self.freq.get(word, 1) for word in candidates_to_consider])
+                    letter_counts = weights @ presence
                 else:
-                    letter_counts = Counter(''.join(candidates_to_consider))
-                best_score = -1
-                best_guess = None
-                scores = []
-                for word in candidates_to_consider:
-                    score = sum(letter_counts.get(c, 0) for c in set(word))
-                    scores.append((word, score))
-                    if score > best_score:
-                        best_score = score
-                        best_guess = word
+                    letter_counts = np.bincount(self.word_list_u8[cons_idx].ravel(), minlength=26)
+                # Score each word by its distinct letters, the first best word wins ties
+                scores = presence @ letter_counts
+                best_guess = candidates_to_consider[scores.argmax()]
                 guess = best_guess
             else:
                 best_entropy = -1
                 best_guess = None
                 total_weight = (sum(self.freq.get(word, 1) for word in candidates_to_consider)
                                 if self.use_frequency else len(candidates_to_consider))
+                weights = ([self.freq.get(word, 1) for word in candidates_to_consider]
+                           if self.use_frequency else None)
                 entropies = []
-                for candidate in candidates_to_consider:
-                    distribution = {}
-                    for answer in candidates_to_consider:
-                        pattern = self.get_feedback(candidate, answer)
-                        weight = self.freq.get(answer, 1) if self.use_frequency else 1
-                        distribution[pattern] = distribution.get(pattern, 0) + weight
-                    entropy = 0
-                    for count in distribution.values():
-                        p = count / total_weight
-                        entropy -= p * math.log2(p)
+                for candidate, i in zip(candidates_to_consider, cons_idx):
+                    entropy = pattern_entropy(self.pattern_matrix[i, cons_idx], weights, total_weight)
                     entropies.append((candidate, entropy))
                     if entropy > best_entropy:
                         best_entropy = entropy
                         best_guess = candidate
                 guess = best_guess
-            self._tried.append(guess)
-            self.console.print(guess)
+            self._add_tried(guess)
+            self._print(guess)
             self.last_guess = guess
         return guess
\ No newline at end of file
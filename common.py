@@ -0,0 +1,92 @@
+import os
+import hashlib
+import tempfile
+import yaml
+import numpy as np
+from numba import njit, prange
+
+# libyaml bindings when available, the word lists are plain string lists either way
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+def encode_words(words):
+    """Letter codes (0-25) of five-letter words as an (N, 5) uint8 array"""
+    return np.frombuffer(''.join(words).encode(), dtype=np.uint8).reshape(-1, 5) - ord('a')
+
+def encode_feedback(result):
+    """Turn a feedback string from wordle.py into the same base-3 code as feedback_code"""
+    code = 0
+    for mark in result:
+        code = code * 3 + (0 if mark == '+' else 1 if mark == '-' else 2)
+    return code
+
+@njit(cache=True, inline='always')
+def feedback_code(g, a, left):
+    """Base-3 feedback code of guess g against answer a, both uint8[5] letter codes, first letter
+    most significant (2 = right spot, 1 = elsewhere, 0 = absent).
+    left is a zeroed 26-entry scratch counter owned by the caller, and is zeroed again on return"""
+    # One pass for the greens (as a 5-bit mask) and the answer letters left over after them
+    greens = 0
+    for i in range(5):
+        if g[i] == a[i]:
+            greens |= 1 << i
+        else:
+            left[a[i]] += 1
+    code = 0
+    for i in range(5):
+        mark = 0
+        if greens & (1 << i):
+            mark = 2
+        elif left[g[i]] > 0:
+            left[g[i]] -= 1
+            mark = 1
+        code = code * 3 + mark
+    for i in range(5):
+        left[a[i]] = 0
+    return code
+
+@njit(cache=True, parallel=True)
+def feedback_matrix(guesses_u8, answers_u8):
+    """Feedback code of every guess (row) against every answer (column), rows spread across cores"""
+    pattern = np.empty((len(guesses_u8), len(answers_u8)), np.uint8)
+    for i in prange(len(guesses_u8)):
+        left = np.zeros(26, np.int8)
+        for j in range(len(answers_u8)):
+            pattern[i, j] = feedback_code(guesses_u8[i], answers_u8[j], left)
+    return pattern
+
+def load_pattern_matrix(words, words_u8, cache_dir='.cache', build=None):
+    """Feedback code of every word (row, as guess) against every word (column, as answer),
+    saved under cache_dir keyed by a hash of the list and memory-mapped on later runs.
+    build(words_u8), if given, computes the matrix instead of feedback_matrix"""
+    h = hashlib.md5(','.join(words).encode()).hexdigest()[:8]
+    path = os.path.join(cache_dir, f'pattern_{h}.npy')
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written under a temporary name and renamed into place, so runs started together never load a half-written file
+        fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix='.npy')
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, build(words_u8) if build else feedback_matrix(words_u8, words_u8))
+        os.replace(tmp, path)
+    # Mapped on the first run too, so kernels always see the same array type
+    return np.load(path, mmap_mode='r')
+
+def nlogn_table(n):
+    """c * log2(c) for every count c from 0 to n, with 0 for c = 0"""
+    table = np.zeros(n + 1)
+    c = np.arange(1, n + 1)
+    table[1:] = c * np.log2(c)
+    return table
+
+def pattern_entropies(pattern, nlogn, weights=None):
+    """Entropy of each row of feedback codes, from one 2D histogram; weights, if given,
+    weigh the columns (answers)"""
+    # Each row is offset into its own block of 243 bins
+    k, n = pattern.shape
+    flat = (pattern + 243 * np.arange(k)[:, None]).ravel()
+    if weights is None:
+        counts = np.bincount(flat, minlength=243 * k).reshape(k, 243)
+        # H = log2(n) - sum(c * log2(c)) / n, with c * log2(c) looked up instead of computing p and log2(p)
+        return np.log2(n) - nlogn[counts].sum(axis=1) / n
+    counts = np.bincount(flat, weights=np.tile(weights, k), minlength=243 * k).reshape(k, 243)
+    p = counts / counts[0].sum()
+    return -(p * np.log2(p, where=p > 0, out=np.zeros_like(p))).sum(axis=1)
@@ -1,77 +1,136 @@
 from random import choice, sample
 import yaml
 from collections import Counter
-import math
-from functools import lru_cache
-from tqdm import tqdm
 import time
 import itertools
 from string import ascii_lowercase
+import numpy as np
+from numba import njit, prange
+from common import YamlLoader, encode_words, feedback_matrix, load_pattern_matrix, nlogn_table, pattern_entropies
+
+ALL_GREEN = 242  # feedback code of a solved guess
+
+@njit(cache=True)
+def best_entropy_guess(pattern, guess_ids, cand_idx, nlogn, skip):
+    """Row of pattern among guess_ids (other than skip) with the highest entropy over
+    the answers at cand_idx; the first one wins ties"""
+    n = len(cand_idx)
+    counts = np.zeros(243, np.int64)
+    best, best_ent = -1, -1.0
+    # Rows are read in place, never copied out as a sub-matrix
+    for g in guess_ids:
+        if g == skip:
+            continue
+        for j in cand_idx:
+            counts[pattern[g, j]] += 1
+        total = 0.0
+        for c in range(243):
+            total += nlogn[counts[c]]
+            counts[c] = 0
+        ent = np.log2(n) - total / n
+        if ent > best_ent:
+            best, best_ent = g, ent
+    return best
+
+@njit(cache=True)
+def play_game(answer, pattern, first_row, second_row, second_ids, nlogn):
+    """Number of guesses to solve answer, 6 on a failure; second_row of length 0
+    means the second guess is second_ids[first feedback code]"""
+    if first_row[answer] == ALL_GREEN:
+        return 1
+    cand_idx = np.flatnonzero(first_row == first_row[answer])
+    if len(second_row) == 0:
+        second_row = pattern[second_ids[first_row[answer]]]
+    if second_row[answer] == ALL_GREEN:
+        return 2
+    cand_idx = cand_idx[second_row[cand_idx] == second_row[answer]]
+    guess_count = 2
+    while len(cand_idx) and guess_count < 6:
+        guess_count += 1
+        if len(cand_idx) <= 2:
+            # With two left both score exactly 1 bit, so the first one is what the search would pick
+            guess = cand_idx[0]
+        else:
+            # Later guesses come from the candidates themselves
+            guess = best_entropy_guess(pattern, cand_idx, cand_idx, nlogn, -1)
+        row = pattern[guess]
+        if row[answer] == ALL_GREEN:
+            return guess_count
+        cand_idx = cand_idx[row[cand_idx] == row[answer]]
+    return 6
+
+@njit(cache=True, parallel=True)
+def play_games(answers, pattern, first_row, second_row, first_id, nlogn):
+    """Guess counts of a batch of games, one game per core at a time"""
+    second_ids = np.full(243, -1, np.int64)
+    if len(second_row) == 0:
+        # The best second word depends only on the first feedback, so score each
+        # feedback that occurs once instead of once per game
+        codes = np.unique(first_row[answers])
+        for c in prange(len(codes)):
+            if codes[c] != ALL_GREEN:
+                cand_idx = np.flatnonzero(first_row == codes[c])
+                second_ids[codes[c]] = best_entropy_guess(pattern, np.arange(len(pattern)), cand_idx, nlogn, first_id)
+    out = np.empty(len(answers), np.int8)
+    for i in prange(len(answers)):
+        out[i] = play_game(answers[i], pattern, first_row, second_row, second_ids, nlogn)
+    return out
 
 class WordleDebugger:
     def __init__(self, wordlist_path='dev_wordlist.yaml'):
-        self.word_list = yaml.load(open(wordlist_path), Loader=yaml.FullLoader)
+        self.word_list = yaml.load(open(wordlist_path), Loader=YamlLoader)
         self.total_words = len(self.word_list)
-        # Extract letter frequency information
-        self.letter_freqs = self._calculate_letter_frequencies()
-        
-    def _calculate_letter_frequencies(self):
-        """Calculate letter frequencies in the word list by position."""
-        position_freqs = [{} for _ in range(5)]
-        for word in self.word_list:
-            for i, letter in enumerate(word):
-                position_freqs[i][letter] = position_freqs[i].get(letter, 0) + 1
-        
-        # Convert to frequency
-        for pos_dict in position_freqs:
-            for letter in pos_dict:
-                pos_dict[letter] /= self.total_words
-                
-        return position_freqs
-        
-    @lru_cache(maxsize=1000000)
-    def get_feedback(self, guess, answer):
-        """Calculate feedback pattern using memoization."""
-        counts = Counter(answer)
-        feedback = [''] * len(guess)
-        
-        # First pass: mark correct positions
-        for i, letter in enumerate(guess):
-            if letter == answer[i]:
-                feedback[i] = letter
-                counts[letter] -= 1
-            else:
-                feedback[i] = '+'
-                
-        # Second pass: mark letters that are present but misplaced
-        for i, letter in enumerate(guess):
-            if feedback[i] == '+' and letter in answer and counts[letter] > 0:
-                feedback[i] = '-'
-                counts[letter] -= 1
-                
-        return ''.join(feedback)
+        self.word_list_u8 = encode_words(self.word_list)  # (N, 5) letter codes
+        self.word_id = {w: i for i, w in enumerate(self.word_list)}
+        # Feedback of every list word against every other; synthetic guesses get rows on demand
+        self.pattern_matrix = load_pattern_matrix(self.word_list, self.word_list_u8)
+        self.nlogn = nlogn_table(self.total_words)
+        self.extra_rows = {}
+
+    def word_ids(self, words):
+        """Positions of a list of words in word_list"""
+        return np.array([self.word_id[w] for w in words], dtype=np.intp)
+    
+    def feedback_row(self, guess):
+        """Feedback codes of a guess against every word in the list, as in the pattern matrix"""
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess]]
+        if guess not in self.extra_rows:
+            self.extra_rows[guess] = feedback_matrix(encode_words([guess]), self.word_list_u8)[0]
+        return self.extra_rows[guess]
     
-    @lru_cache(maxsize=10000)
-    def calculate_pattern_distribution(self, guess, candidates_tuple):
-        """Calculate pattern distribution for a given guess and candidate set."""
-        distribution = {}
-        for answer in candidates_tuple:
-            pattern = self.get_feedback(guess, answer)
-            distribution[pattern] = distribution.get(pattern, 0) + 1
-        return distribution
+    def calculate_pattern_distribution(self, guess, cand_idx):
+        """Count of each of the 243 feedback codes a guess gets over the candidates at cand_idx."""
+        return np.bincount(self.feedback_row(guess)[cand_idx], minlength=243)
     
-    def calculate_entropy(self, guess, candidates):
-        """Calculate entropy for a given guess against the candidate set."""
-        # Avoid converting repeatedly if already a tuple.
-        if not isinstance(candidates, tuple):
-            candidates = tuple(candidates)
-        total_weight = len(candidates)
-        distribution = self.calculate_pattern_distribution(guess, candidates)
-        entropy = 0
-        for count in distribution.values():
-            p = count / total_weight
-            entropy -= p * math.log2(p)
-        return entropy
+    def pattern_string(self, guess, code):
+        """Feedback code written out like wordle.py: the letter if right, '-' if misplaced, '+' if absent."""
+        marks = []
+        for letter in reversed(guess):
+            code, mark = divmod(code, 3)
+            marks.append(letter if mark == 2 else '-' if mark == 1 else '+')
+        return ''.join(reversed(marks))
+    
+    def calculate_entropy(self, guess, cand_idx):
+        """Calculate entropy for a given guess against the candidates at cand_idx."""
+        patterns = self.feedback_row(guess)[cand_idx]
+        counts = np.bincount(patterns, minlength=243)
+        n = len(cand_idx)
+        return np.log2(n) - self.nlogn[counts].sum() / n
+    
+    def calculate_entropies(self, words, cand_idx, chunk=1024):
+        """Entropy of each of a list of guesses against the candidates at cand_idx,
+        scored a chunk of guesses at a time instead of one call per guess"""
+        ids = [self.word_id.get(w) for w in words]
+        entropies = np.empty(len(words))
+        for start in range(0, len(words), chunk):
+            if None in ids[start:start + chunk]:
+                # Synthetic guesses have no matrix row, so run the kernel on the whole chunk
+                pattern = feedback_matrix(encode_words(words[start:start + chunk]), self.word_list_u8[cand_idx])
+            else:
+                pattern = self.pattern_matrix[np.ix_(ids[start:start + chunk], cand_idx)]
+            entropies[start:start + chunk] = pattern_entropies(pattern, self.nlogn)
+        return entropies
     
     def generate_synthetic_words(self, num_words=1000, strategy='frequency'):
         """
@@ -84,13 +143,15 @@ class WordleDebugger:
         """
         if strategy == 'frequency':
             # Generate words using letter frequency by position
+            # Letters seen in each position, in order of first appearance in the list
+            position_letters = []
+            for pos in range(5):
+                codes, first_seen = np.unique(self.word_list_u8[:, pos], return_index=True)
+                position_letters.append([chr(ord('a') + c) for c in codes[np.argsort(first_seen)]])
             synthetic_words = []
             for _ in range(num_words):
-                word = ''
-                for pos in range(5):
-                    # Sample letter based on frequency in this position
-                    letters, freqs = zip(*self.letter_freqs[pos].items())
-                    word += choice(letters)  # Simple sampling, could be weighted
+                # Sample letter based on frequency in this position
+                word = ''.join(choice(letters) for letters in position_letters)  # Simple sampling, could be weighted
                 synthetic_words.append(word)
             return synthetic_words
             
@@ -122,12 +183,8 @@ class WordleDebugger:
             candidates += self.generate_synthetic_words(num_words * 10, 'frequency')
             
             # Evaluate entropy for each candidate
-            candidates_tuple = tuple(self.word_list)
-            word_entropies = []
-            
-            for word in tqdm(candidates):
-                entropy = self.calculate_entropy(word, candidates_tuple)
-                word_entropies.append((word, entropy))
+            entropies = self.calculate_entropies(candidates, np.arange(self.total_words))
+            word_entropies = list(zip(candidates, entropies.tolist()))
             
             word_entropies.sort(key=lambda x: x[1], reverse=True)
             return [word for word, _ in word_entropies[:num_words]]
@@ -137,10 +194,11 @@ class WordleDebugger:
     
     def find_best_starters(self, num_words=20, sample_size=None, include_synthetic=True):
         """Find the best starting words based on entropy."""
+        # Answers are carried as positions in word_list; sampling range(N) draws the same words as sampling the list
         if sample_size is None:
-            candidates = tuple(self.word_list)
+            cand_idx = np.arange(self.total_words)
         else:
-            candidates = tuple(sample(self.word_list, min(sample_size, len(self.word_list))))
+            cand_idx = np.array(sample(range(self.total_words), min(sample_size, self.total_words)))
         
         # Define word candidates to evaluate
         words_to_evaluate = []
@@ -163,45 +221,41 @@ class WordleDebugger:
         
         print(f"Analyzing {len(words_to_evaluate)} words to find the best {num_words} starters...")
         
-        word_entropies = []
-        for word in tqdm(words_to_evaluate):
-            entropy = self.calculate_entropy(word, candidates)
-            word_entropies.append((word, entropy))
+        entropies = self.calculate_entropies(words_to_evaluate, cand_idx)
+        word_entropies = list(zip(words_to_evaluate, entropies.tolist()))
         
         word_entropies.sort(key=lambda x: x[1], reverse=True)
         return word_entropies[:num_words]
     
     def analyze_second_guesses(self, first_guess, num_patterns=10, num_second_guesses=5):
         """Analyze the best second guesses after a given first guess for the most common patterns."""
-        candidates_tuple = tuple(self.word_list)
-        pattern_distribution = self.calculate_pattern_distribution(first_guess, candidates_tuple)
+        row = self.feedback_row(first_guess)
+        pattern_distribution = self.calculate_pattern_distribution(first_guess, np.arange(self.total_words))
         
-        # Sort patterns by frequency (most common first)
-        sorted_patterns = sorted(pattern_distribution.items(), key=lambda x: x[1], reverse=True)
+        # Sort patterns by frequency (most common first), ties in order of first appearance
+        codes, first_seen = np.unique(row, return_index=True)
+        codes = codes[np.argsort(first_seen)].tolist()
+        sorted_patterns = sorted(codes, key=lambda code: pattern_distribution[code], reverse=True)
         top_patterns = sorted_patterns[:num_patterns]
         
         results = {}
-        for pattern, count in top_patterns:
+        for code in top_patterns:
+            count = int(pattern_distribution[code])
             # Find words that would produce this pattern
-            filtered_candidates = [word for word in self.word_list 
-                                  if self.get_feedback(first_guess, word) == pattern]
-            filtered_tuple = tuple(filtered_candidates)
+            filtered_idx = np.flatnonzero(row == code)
             
             # Calculate best second guesses
-            word_entropies = []
-            for word in self.word_list:
-                if word != first_guess:  # Don't repeat the first guess
-                    entropy = self.calculate_entropy(word, filtered_tuple)
-                    word_entropies.append((word, entropy))
+            second_words = [word for word in self.word_list if word != first_guess]  # Don't repeat the first guess
+            entropies = self.calculate_entropies(second_words, filtered_idx)
+            # Stable, like the old descending sort, so equal entropies keep word-list order
+            top = np.argsort(-entropies, kind='stable')[:num_second_guesses]
+            best_second_guesses = [(second_words[i], float(entropies[i])) for i in top]
             
-            word_entropies.sort(key=lambda x: x[1], reverse=True)
-            best_second_guesses = word_entropies[:num_second_guesses]
-            
-            results[pattern] = {
+            results[self.pattern_string(first_guess, code)] = {
                 'count': count,
                 'percentage': (count / self.total_words) * 100,
                 'best_second_guesses': best_second_guesses,
-                'remaining_candidates': len(filtered_candidates)
+                'remaining_candidates': len(filtered_idx)
             }
         
         return results
@@ -214,75 +268,21 @@ class WordleDebugger:
         - 'highest_entropy': choose the word with highest entropy
         - 'fixed_word': use the same second word provided as a parameter
         """
-        total_guesses = 0
-        max_guesses = 0
-        guess_distribution = Counter()
-        
-        def simulate_game(answer):
-            nonlocal total_guesses, max_guesses
-            
-            guesses = [first_word]
-            candidates = self.word_list.copy()
-            
-            # Process first guess
-            pattern = self.get_feedback(first_word, answer)
-            if pattern == answer:  # Solved in one guess
-                guess_distribution[1] += 1
-                return 1
-            
-            candidates = [word for word in candidates if self.get_feedback(first_word, word) == pattern]
-            
-            # Choose second word
-            if second_word_strategy == 'highest_entropy':
-                candidates_tuple = tuple(candidates)
-                best_second_word = max(self.word_list, 
-                                      key=lambda word: self.calculate_entropy(word, candidates_tuple) if word != first_word else -1)
-                second_word = best_second_word
-            else:
-                second_word = second_word_strategy  # Using the provided fixed second word
-            
-            guesses.append(second_word)
-            
-            # Process second guess
-            pattern = self.get_feedback(second_word, answer)
-            if pattern == answer:  # Solved in two guesses
-                guess_distribution[2] += 1
-                return 2
-            
-            candidates = [word for word in candidates if self.get_feedback(second_word, word) == pattern]
-            
-            # Continue with standard entropy-based approach
-            guess_count = 2
-            while candidates and guess_count < 6:
-                guess_count += 1
-                
-                if len(candidates) == 1:
-                    next_guess = candidates[0]
-                else:
-                    candidates_tuple = tuple(candidates)
-                    next_guess = max(candidates, 
-                                    key=lambda word: self.calculate_entropy(word, candidates_tuple))
-                
-                guesses.append(next_guess)
-                pattern = self.get_feedback(next_guess, answer)
-                
-                if pattern == answer:
-                    guess_distribution[guess_count] += 1
-                    return guess_count
-                
-                candidates = [word for word in candidates if self.get_feedback(next_guess, word) == pattern]
-            
-            # Failed to guess in 6 tries
-            guess_distribution[6] += 1
-            return 6
-        
         sample_answers = sample(self.word_list, min(num_games, len(self.word_list)))
         
         start_time = time.time()
-        for answer in tqdm(sample_answers):
-            num_guesses = simulate_game(answer)
-            total_guesses += num_guesses
-            max_guesses = max(max_guesses, num_guesses)
+        # Play every game inside numba on answer ids and the pattern matrix
+        # Rows are copied so list and synthetic words reach the kernel as the same (writable) array type
+        first_row = np.array(self.feedback_row(first_word))
+        if second_word_strategy == 'highest_entropy':
+            second_row = np.empty(0, np.uint8)
+        else:
+            second_row = np.array(self.feedback_row(second_word_strategy))  # Using the provided fixed second word
+        num_guesses = play_games(self.word_ids(sample_answers), self.pattern_matrix, first_row, second_row,
+                                 self.word_id.get(first_word, -1), self.nlogn)
+        total_guesses = int(num_guesses.sum())
+        max_guesses = int(num_guesses.max())
+        guess_distribution = Counter(num_guesses.tolist())
         
         avg_guesses = total_guesses / len(sample_answers)
         execution_time = time.time() - start_time
@@ -309,12 +309,8 @@ class WordleDebugger:
             "eaito", "earls", "stnlr", "saeio", "arise", "orate"
         ]
         
-        results = []
-        candidates_tuple = tuple(self.word_list)
-        
-        for word in candidates:
-            entropy = self.calculate_entropy(word, candidates_tuple)
-            results.append((word, entropy))
+        all_idx = np.arange(self.total_words)
+        results = [(word, self.calculate_entropy(word, all_idx)) for word in candidates]
         
         results.sort(key=lambda x: x[1], reverse=True)
         return results
@@ -1,10 +1,10 @@
 from random import choice
 import yaml
 from rich.console import Console
-import math
 from collections import Counter, defaultdict
 from itertools import product, permutations
-from functools import lru_cache
+import numpy as np
+from common import YamlLoader, encode_words, encode_feedback, feedback_matrix, load_pattern_matrix, nlogn_table, pattern_entropies
 
 # Toggles
 USE_FREQUENCY = False        
@@ -14,16 +14,28 @@ DUMMY_GUESS_TOGGLE = True     # enable the dummy guess feature
 DUMMY_PLUS_COUNTS = [1, 2]      # dummy guess activates if result.count('+') is in this list.
 DUMMY_GUESS_ONE_PER_CASE = True  # allow one dummy guess per distinct feedback.
 
+# All 120 orderings of five positions, to spell every permutation of five letters
+PERMUTATIONS_5 = np.array(list(permutations(range(5))), dtype=np.intp)
+
 class Guesser:
     """
         Welcome to Davide's guesser optimised for correctness and performance on larger wordlists!
     """
     def __init__(self, manual, use_frequency=USE_FREQUENCY):
-        self.word_list = yaml.load(open('data/wordlist.yaml'), Loader=yaml.FullLoader)
+        self.word_list = yaml.load(open('data/wordlist.yaml'), Loader=YamlLoader)
+        self.word_list_u8 = encode_words(self.word_list)  # (N, 5) letter codes
+        self.word_id = {w: i for i, w in enumerate(self.word_list)}
+        # Bit k set when letter k appears in the word
+        self.word_mask = np.bitwise_or.reduce(np.uint32(1) << self.word_list_u8.astype(np.uint32), axis=1)
+        # Feedback of every list word against every other, built once and kept under .cache
+        self.pattern_matrix = load_pattern_matrix(self.word_list, self.word_list_u8)
+        self.nlogn = nlogn_table(len(self.word_list))
         self._manual = manual 
         self.console = Console()
+        # Rich is only worth its markup handling when a person is playing
+        self._print = self.console.print if manual == 'manual' else print
         self._tried = []  
-        self.candidates = self.word_list.copy() 
+        self.cand_idx = np.arange(len(self.word_list))  # positions of the remaining candidates in word_list
         self.last_guess = None
         self.use_frequency = use_frequency
         self.best_first_word = None  
@@ -40,54 +52,35 @@ class Guesser:
                         except ValueError:
                             frequency = 1.0
                         self.freq[word] = frequency
+            # The same weights as an array over word_list, to index with cand_idx
+            self.freq_vec = np.array([self.freq.get(word, 1) for word in self.word_list], dtype=float)
 
     def restart_game(self):
         self._tried = []
-        self.candidates = self.word_list.copy()
+        self.cand_idx = np.arange(len(self.word_list))
         self.last_guess = None
         self.used_dummy = set()
 
-    @lru_cache(maxsize=None)
-    def get_feedback(self, guess, answer):
-        counts = Counter(answer)
-        feedback = [''] * len(guess)
-        for i, letter in enumerate(guess):
-            if letter == answer[i]:
-                feedback[i] = letter
-                counts[letter] -= 1
-            else:
-                feedback[i] = '+'
-        for i, letter in enumerate(guess):
-            if letter != answer[i] and letter in answer and counts[letter] > 0:
-                feedback[i] = '-'
-                counts[letter] -= 1
-        return ''.join(feedback)
+    def feedback_codes(self, guess, cand_idx):
+        """Feedback codes of a guess against the words at cand_idx, read from the
+        pattern matrix when the guess is a list word and computed otherwise"""
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess], cand_idx]
+        return feedback_matrix(encode_words([guess]), self.word_list_u8[cand_idx])[0]
     
-    @lru_cache(maxsize=None)
-    def pattern_distribution(self, guess, candidates_tuple):
-        distribution = {}
-        for answer in candidates_tuple:
-            pattern = self.get_feedback(guess, answer)
-            if self.use_frequency:
-                weight = self.freq.get(answer, 1)
-                distribution[pattern] = distribution.get(pattern, 0) + weight
-            else:
-                distribution[pattern] = distribution.get(pattern, 0) + 1
-        return distribution
+    def untried_idx(self):
+        """cand_idx without the words guessed so far in this game"""
+        tried = [self.word_id[w] for w in self._tried if w in self.word_id]
+        return self.cand_idx[~np.isin(self.cand_idx, tried)]
     
-    def entropy(self, guess, candidates):
-        if not isinstance(candidates, tuple):
-            candidates = tuple(candidates)
-        distribution = self.pattern_distribution(guess, candidates)
+    def candidate_entropies(self, ids):
+        """Entropy of each of the words at ids over the current candidates, from their
+        pattern-matrix rows in one batch"""
+        patterns = self.pattern_matrix[np.ix_(ids, self.cand_idx)]
+        weights = None
         if self.use_frequency:
-            total_weight = sum(self.freq.get(word, 1) for word in candidates)
-        else:
-            total_weight = len(candidates)
-        ent = 0
-        for count in distribution.values():
-            p = count / total_weight
-            ent -= p * math.log2(p)
-        return ent
+            weights = self.freq_vec[self.cand_idx]
+        return pattern_entropies(patterns, self.nlogn, weights)
     
     def best_first_guess(self):
         """Compute the best starting guess (using entropy over candidates)
@@ -96,10 +89,10 @@ class Guesser:
             return self.best_first_word
             
         pos_counters = [defaultdict(int) for _ in range(5)]
-        for word in self.candidates:
-            for i, letter in enumerate(word):
-                pos_counters[i][letter] += 1
-        candidates_sample = tuple(self.candidates)
+        sample_idx = self.cand_idx
+        for i in sample_idx:
+            for pos, letter in enumerate(self.word_list[i]):
+                pos_counters[pos][letter] += 1
         top_letters = []
         for i, counter in enumerate(pos_counters):
             top_for_pos = sorted(counter.items(), key=lambda x: x[1], reverse=True)[:2]
@@ -116,17 +109,18 @@ class Guesser:
                 potential_words.add(word)
             except StopIteration:
                 break
-        best_word = None
-        best_ent = -1
-        for word in potential_words:
-            ent = self.entropy(word, candidates_sample)
-            if ent > best_ent:
-                best_ent = ent
-                best_word = word
+        # Repeated letters waste a slot in an opener, so drop those combinations up front
+        potential_words = [word for word in potential_words if len(set(word)) == 5] or list(potential_words)
+        # Most of these are made-up combinations, so score them all in one kernel call
+        patterns = feedback_matrix(encode_words(potential_words), self.word_list_u8[sample_idx])
+        weights = None
+        if self.use_frequency:
+            weights = self.freq_vec[sample_idx]
+        best_word = potential_words[int(np.argmax(pattern_entropies(patterns, self.nlogn, weights)))]
         self.best_first_word = best_word
         return best_word
 
-    def try_dummy_guess(self, candidates_to_consider, result):
+    def try_dummy_guess(self, ids, result):
         if not DUMMY_GUESS_TOGGLE:
             return None
         
@@ -137,7 +131,7 @@ class Guesser:
                     return None
                 self.used_dummy.add(result)
             pos = result.index('+')
-            letters = [word[pos] for word in candidates_to_consider]
+            letters = [chr(ord('a') + code) for code in self.word_list_u8[ids, pos]]
             distinct_letters = set(letters)
             if len(distinct_letters) < 3:
                 return None
@@ -158,22 +152,26 @@ class Guesser:
             return None
         first_guess = self._tried[0]
         known_letters = {letter for letter, mark in zip(first_guess, first_feedback) if mark != '+'}
-        overall_counter = Counter(''.join(self.candidates))
-        filtered_counter = {letter: count for letter, count in overall_counter.items() if letter not in known_letters}
+        letters = self.word_list_u8[self.cand_idx].ravel()
+        letter_counts = np.bincount(letters, minlength=26)
+        for letter in known_letters:
+            letter_counts[ord(letter) - ord('a')] = 0
+        # Most frequent first, ties in order of first appearance among the candidates
+        present, first_seen = np.unique(letters, return_index=True)
+        keep = letter_counts[present] > 0
+        present, first_seen = present[keep], first_seen[keep]
         top_n = 5  # use only the top 5 letters to limit permutations.
-        top_letters = [letter for letter, _ in sorted(filtered_counter.items(), key=lambda x: x[1], reverse=True)[:top_n]]
-        if len(top_letters) < 5:
+        top_codes = present[np.lexsort((first_seen, -letter_counts[present]))[:top_n]]
+        if len(top_codes) < 5:
             return None 
-        distinct_candidates = {''.join(p) for p in permutations(top_letters, 5)}
-        candidates_tuple = tuple(self.candidates)
-        best_guess = None
-        best_e = -1
-        for candidate in distinct_candidates:
-            e = self.entropy(candidate, candidates_tuple)
-            if e > best_e:
-                best_e = e
-                best_guess = candidate
-        return best_guess
+        # None of these need to be words, so spell all 120 as letter codes and score them in one kernel call
+        distinct_u8 = top_codes[PERMUTATIONS_5]
+        patterns = feedback_matrix(distinct_u8, self.word_list_u8[self.cand_idx])
+        weights = None
+        if self.use_frequency:
+            weights = self.freq_vec[self.cand_idx]
+        best = PERMUTATIONS_5[int(np.argmax(pattern_entropies(patterns, self.nlogn, weights)))]
+        return ''.join(chr(ord('a') + top_codes[i]) for i in best)
 
     def get_guess(self, result):
         if self._manual == 'manual':
@@ -183,86 +181,68 @@ class Guesser:
             return guess
         else:
             if self.last_guess is not None:
-                self.candidates = [word for word in self.candidates 
-                                   if self.get_feedback(self.last_guess, word) == result]
-            if not self.candidates:
-                self.candidates = self.word_list.copy()
+                keep = self.feedback_codes(self.last_guess, self.cand_idx) == encode_feedback(result)
+                self.cand_idx = self.cand_idx[keep]
+            if not len(self.cand_idx):
+                self.cand_idx = np.arange(len(self.word_list))
             if not self._tried:
                 if not self.best_first_word:
                     self.best_first_word = self.best_first_guess()
                 guess = self.best_first_word
                 if guess is None:
-                    guess = choice(self.candidates)
+                    guess = self.word_list[choice(self.cand_idx)]
                 self._tried.append(guess)
-                self.console.print(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
             if len(self._tried) == 1 and TWO_GUESS_DISTINCT:
                 guess = self.distinct_second_guess(result)
                 if guess is None:
-                    candidates_tuple = tuple(self.candidates)
-                    best_e = -1
-                    best_guess = None
-                    candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-                    for candidate in candidates_to_consider:
-                        e = self.entropy(candidate, candidates_tuple)
-                        if e > best_e:
-                            best_e = e
-                            best_guess = candidate
-                    guess = best_guess
+                    ids = self.untried_idx()
+                    if len(ids):
+                        guess = self.word_list[ids[int(np.argmax(self.candidate_entropies(ids)))]]
                 self._tried.append(guess)
-                self.console.print("Distinct second guess:", guess)
+                self._print("Distinct second guess:", guess)
                 self.last_guess = guess
                 return guess
-            if len(self.candidates) == 1:
-                guess = self.candidates[0]
+            if len(self.cand_idx) == 1:
+                guess = self.word_list[self.cand_idx[0]]
                 self._tried.append(guess)
-                self.console.print(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
 
-            candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-            if not candidates_to_consider:
-                candidates_to_consider = self.candidates
-            dummy_guess = self.try_dummy_guess(candidates_to_consider, result)
+            # Words are only looked up for the guess that is returned
+            ids = self.untried_idx()
+            if not len(ids):
+                ids = self.cand_idx
+            dummy_guess = self.try_dummy_guess(ids, result)
             if dummy_guess is not None:
                 guess = dummy_guess
                 self._tried.append(guess)
-                self.console.print("Dummy guess:", guess)
+                self._print("Dummy guess:", guess)
                 self.last_guess = guess
                 return guess
     
-            if len(candidates_to_consider) > 100:
+            if len(ids) > 100:
+                present = (self.word_mask[ids, None] >> np.arange(26, dtype=np.uint32)) & 1
                 if self.use_frequency:
-                    letter_counts = {}
-                    for word in candidates_to_consider:
-                        weight = self.freq.get(word, 1)
-                        for letter in set(word):
-                            letter_counts[letter] = letter_counts.get(letter, 0) + weight
+                    weights = self.freq_vec[ids]
+                    letter_counts = weights @ present
                 else:
-                    letter_counts = Counter(''.join(candidates_to_consider))
-                best_score = -1
-                best_guess = None
-                for word in candidates_to_consider:
-                    score = sum(letter_counts.get(c, 0) for c in set(word))
-                    if score > best_score:
-                        best_score = score
-                        best_guess = word
-                guess = best_guess
+                    letter_counts = np.bincount(self.word_list_u8[ids].ravel(), minlength=26)
+                # Score of a word: letter counts summed over its distinct letters
+                scores = present @ letter_counts
+                guess = self.word_list[ids[int(np.argmax(scores))]]
+            elif len(self.cand_idx) <= 2:
+                # Either of two candidates splits the pair evenly, so the entropy search would pick the first
+                guess = self.word_list[ids[0]]
             else:
-                candidates_tuple = tuple(self.candidates)
-                best_e = -1
-                best_guess = None
-                for candidate in candidates_to_consider:
-                    e = self.entropy(candidate, candidates_tuple)
-                    if e > best_e:
-                        best_e = e
-                        best_guess = candidate
-                guess = best_guess
+                guess = self.word_list[ids[int(np.argmax(self.candidate_entropies(ids)))]]
                 
             if guess is None:
-                guess = choice(self.candidates)
+                guess = self.word_list[choice(self.cand_idx)]
             self._tried.append(guess)
-            self.console.print(guess)
+            self._print(guess)
             self.last_guess = guess
         return guess
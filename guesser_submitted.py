@@ -1,10 +1,56 @@
-from random import choice
+import os
+import json
+import hashlib
+import tempfile
 import yaml
 from rich.console import Console
-import math
-from collections import Counter, defaultdict
-from functools import lru_cache
+from collections import defaultdict
 from itertools import product
+import numpy as np
+from numba import njit, prange
+from common import YamlLoader, encode_words, encode_feedback, feedback_code, load_pattern_matrix, nlogn_table
+
+@njit(cache=True)
+def feedback_codes(guess_u8, answers_u8):
+    """Feedback code of one guess against every answer"""
+    codes = np.empty(len(answers_u8), np.uint8)
+    left = np.zeros(26, np.int8)
+    for j in range(len(answers_u8)):
+        codes[j] = feedback_code(guess_u8, answers_u8[j], left)
+    return codes
+
+@njit(cache=True, parallel=True)
+def guess_entropies(guesses_u8, answers_u8, nlogn):
+    """Entropy of the feedback each guess gets over the answers, guesses spread across cores"""
+    n = len(answers_u8)
+    entropies = np.empty(len(guesses_u8))
+    for i in prange(len(guesses_u8)):
+        left = np.zeros(26, np.int8)
+        counts = np.zeros(243, np.int64)
+        for j in range(n):
+            counts[feedback_code(guesses_u8[i], answers_u8[j], left)] += 1
+        # H = log2(n) - sum(c * log2(c)) / n, with c * log2(c) looked up
+        total = 0.0
+        for c in range(243):
+            total += nlogn[counts[c]]
+        entropies[i] = np.log2(n) - total / n
+    return entropies
+
+@njit(cache=True, parallel=True)
+def row_entropies(pattern, guess_ids, cand_idx, nlogn):
+    """Entropy of the feedback each guess row of pattern gets over the answer columns at cand_idx"""
+    n = len(cand_idx)
+    entropies = np.empty(len(guess_ids))
+    for i in prange(len(guess_ids)):
+        counts = np.zeros(243, np.int64)
+        for j in cand_idx:
+            counts[pattern[guess_ids[i], j]] += 1
+        # H = log2(n) - sum(c * log2(c)) / n, with c * log2(c) looked up
+        total = 0.0
+        for c in range(243):
+            total += nlogn[counts[c]]
+        entropies[i] = np.log2(n) - total / n
+    return entropies
 
 class Guesser:
     def __init__(self, manual):
@@ -20,64 +66,48 @@ class Guesser:
 
             (benchmark: MacBook Pro M1 Max)
         """
-        self.word_list = yaml.load(open('wordlist.yaml'), Loader=yaml.FullLoader)
+        self.word_list = yaml.load(open('wordlist.yaml'), Loader=YamlLoader)
+        self.word_list_u8 = encode_words(self.word_list)  # (N, 5) letter codes
+        self.word_id = {w: i for i, w in enumerate(self.word_list)}
+        # Feedback of every word against every other, built once and kept under .cache
+        self.pattern_matrix = load_pattern_matrix(self.word_list, self.word_list_u8)
+        self.extra_rows = {}  # the same for guesses outside the list, such as made-up openers
+        self.nlogn = nlogn_table(len(self.word_list))
         self._manual = manual 
         self.console = Console()
-        self._tried = []
-        self.candidates = self.word_list.copy()
+        # Rich is only worth its markup handling when a person is playing
+        self._print = self.console.print if manual == 'manual' else print
+        self._tried = set()
+        self.cand_idx = np.arange(len(self.word_list))  # positions of the remaining candidates in word_list
         self.last_guess = None
         self.best_first_word = self.best_first_guess()
         
     def restart_game(self):
-        self._tried = []
-        self.candidates = self.word_list.copy()
+        self._tried = set()
+        self.cand_idx = np.arange(len(self.word_list))
         self.last_guess = None
 
-    @lru_cache(maxsize=None)
-    def get_matches(self, guess, answer): # produces feedback string just like in wordle.py
-        counts = Counter(answer)
-        feedback = [''] * len(guess)
-        for i, letter in enumerate(guess):
-            if letter == answer[i]:
-                feedback[i] = letter
-                counts[letter] -= 1
-            else:
-                feedback[i] = '+'
-        for i, letter in enumerate(guess):
-            if feedback[i] == '+' and letter in answer and counts[letter] > 0:
-                feedback[i] = '-'
-                counts[letter] -= 1
-        return ''.join(feedback)
-    
-    @lru_cache(maxsize=None)
-    def pattern_distribution(self, guess, candidates_tuple):
-        """Calculate pattern distribution for a given guess and candidate set."""
-        distribution = {}
-        for answer in candidates_tuple:
-            pattern = self.get_matches(guess, answer)
-            distribution[pattern] = distribution.get(pattern, 0) + 1
-        return distribution
-    
-    def entropy(self, guess, candidates):
-        """Calculate entropy for a given guess against the candidate set."""
-        if not isinstance(candidates, tuple): # avoid converting repeatedly if already a tuple.
-            candidates = tuple(candidates)
-        total_weight = len(candidates)
-        distribution = self.pattern_distribution(guess, candidates)
-        entropy = 0
-        for count in distribution.values():
-            p = count / total_weight
-            entropy -= p * math.log2(p)
-        return entropy
+    def get_matches(self, guess, cand_idx): # feedback codes of a guess against the words at cand_idx, as in wordle.py
+        if guess in self.word_id:
+            return self.pattern_matrix[self.word_id[guess], cand_idx]
+        if guess not in self.extra_rows:
+            self.extra_rows[guess] = feedback_codes(encode_words([guess])[0], self.word_list_u8)
+        return self.extra_rows[guess][cand_idx]
     
     def best_first_guess(self):
         """Calculate the optimal first (non-)word based on entropy,
         but restrict the candidate pool to words built from the most frequent letters in each position."""
+        # The result only depends on the word list, so it is kept on disk next to the pattern matrix
+        h = hashlib.md5(','.join(self.word_list).encode()).hexdigest()[:8]
+        path = os.path.join('.cache', f'best_first_submitted_{h}.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)['word']
         pos_counters = [defaultdict(int) for _ in range(5)]
-        for word in self.candidates:
+        for word in self.word_list:
             for i, letter in enumerate(word):
                 pos_counters[i][letter] += 1
-        candidates_sample = tuple(self.candidates)
+        candidates_sample = self.word_list
         top_letters = []
         for i, counter in enumerate(pos_counters): # get the most common letters for each position
             top_for_pos = sorted(counter.items(), key=lambda x: x[1], reverse=True)[:2]
@@ -96,13 +126,16 @@ class Guesser:
                 potential_words.add(word)
             except StopIteration:
                 break
-        best_word = None
-        best_entropy = -1
-        for word in potential_words:
-            entropy = self.entropy(word, candidates_sample)
-            if entropy > best_entropy:
-                best_entropy = entropy
-                best_word = word
+        # Score the whole pool in one kernel call; the first of equal scores wins, as in a loop
+        potential_words = list(potential_words)
+        entropies = guess_entropies(encode_words(potential_words), encode_words(candidates_sample), self.nlogn)
+        best_word = potential_words[int(np.argmax(entropies))]
+        os.makedirs('.cache', exist_ok=True)
+        # Renamed into place once complete, like the pattern matrix
+        fd, tmp = tempfile.mkstemp(dir='.cache', suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'word': best_word}, f)
+        os.replace(tmp, path)
         return best_word
     
     def get_guess(self, result):
@@ -110,30 +143,27 @@ class Guesser:
             return self.console.input('Your guess:\n')
         else:
             if self.last_guess is not None:
-                self.candidates = [word for word in self.candidates 
-                                   if self.get_matches(self.last_guess, word) == result]
+                keep = self.get_matches(self.last_guess, self.cand_idx) == encode_feedback(result)
+                self.cand_idx = self.cand_idx[keep]
             if not self._tried: # first guess
                 guess = self.best_first_word
-                self._tried.append(guess)
-                self.console.print(guess)
+                self._tried.add(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
-            if len(self.candidates) == 1: # edge case: one candidate left
-                guess = self.candidates[0]
-                self._tried.append(guess)
-                self.console.print(guess)
+            if 0 < len(self.cand_idx) <= 2: # edge case: one or two candidates left, either of two splits them evenly
+                guess = self.word_list[self.cand_idx[0]]
+                self._tried.add(guess)
+                self._print(guess)
                 self.last_guess = guess
                 return guess
-            if not self.candidates: # if no candidates remain (should not happen), reset the candidate list
-                self.candidates = [w for w in self.word_list if w not in self._tried]
-            candidates_to_consider = [w for w in self.candidates if w not in self._tried]
-            if not candidates_to_consider:
-                candidates_to_consider = self.candidates
-            candidates_tuple = tuple(self.candidates) # precompute the tuple version of candidates for efficiency
-            best_guess = max(candidates_to_consider, 
-                             key=lambda candidate: self.entropy(candidate, candidates_tuple))
-            guess = best_guess
-            self._tried.append(guess)
-            self.console.print(guess)
+            if not len(self.cand_idx): # if no candidates remain (should not happen), reset the candidate list
+                tried_ids = [self.word_id[w] for w in self._tried if w in self.word_id]
+                self.cand_idx = np.flatnonzero(~np.isin(np.arange(len(self.word_list)), tried_ids))
+            # No need to drop tried words: each one scored all greens against itself, which the feedback ruled out
+            entropies = row_entropies(self.pattern_matrix, self.cand_idx, self.cand_idx, self.nlogn)
+            guess = self.word_list[self.cand_idx[int(np.argmax(entropies))]]
+            self._tried.add(guess)
+            self._print(guess)
             self.last_guess = guess
             return guess
\ No newline at end of file
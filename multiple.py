@@ -5,6 +5,8 @@ import re
 
 import numpy as np
 import os
+from concurrent.futures import ThreadPoolExecutor
+from common import YamlLoader
 
 print(os.listdir())
 
@@ -18,29 +20,47 @@ else:
 N_INIT, N_WORDS, N_GAMES = int(N_INIT), int(N_WORDS), 500
 
 # _word_list is loaded from the dev set.
-_word_list = yaml.load(open('data/dev_wordlist.yaml'), Loader=yaml.FullLoader)
+_word_list = yaml.load(open('data/dev_wordlist.yaml'), Loader=YamlLoader)
 
 stats = np.zeros(shape=(N_INIT, 3))
+# Drops the % sign (and any letters) from game.py's csv line, compiled once for all runs
+STRIP = re.compile(r"[a-z%]")
+# game.py's numba kernels would otherwise each use every core, so runs started side by side
+# would fight over them; with one thread per run, Time is a single-threaded figure
+CHILD_ENV = dict(os.environ, NUMBA_NUM_THREADS='1')
 
-for i in range(N_INIT):
-    print(f"Run {i+1}: ")
-    word_list = np.random.choice(
-        _word_list,
-        size=N_WORDS,
-        replace=False
-    ).tolist()
-   
-    with open('data/r_wordlist.yaml', 'w') as f:
-        yaml.dump(word_list, f)
+def run_game():
+    """Play N_GAMES rounds of game.py in a subprocess and parse its csv line"""
+    out = subprocess.run(["python3", "game.py", "--r", str(N_GAMES)], capture_output=True, env=CHILD_ENV)
+    accuracy, avg_length, time = STRIP.sub('', out.stdout.decode()).split(',')
+    return float(accuracy), float(avg_length), float(time)
 
-    # Run the game
-    out = subprocess.run(["python3", "game.py", "--r", str(N_GAMES)], capture_output=True)
+# Runs are independent single-threaded subprocesses, so keep up to one per core going at once
+N_WORKERS = os.cpu_count()
+print(f"Up to {N_WORKERS} game.py runs at once, each with numba on one thread: "
+      "the per-run times are not comparable with results from serial, multi-threaded runs.")
+with ThreadPoolExecutor(max_workers=N_WORKERS) as pool:
+    runs = []
+    for i in range(N_INIT):
+        word_list = np.random.choice(
+            _word_list,
+            size=N_WORDS,
+            replace=False
+        ).tolist()
 
-    accuracy, avg_length, time = re.sub(r'[a-z\\\'%]', '', str(out.stdout)).split(',')
-    accuracy, avg_length, time = float(accuracy), float(avg_length), float(time)
-    stats[i, :] = [accuracy, avg_length, time]
+        # Run the game
+        runs.append(pool.submit(run_game))
 
-    print(f"{accuracy:.2f}%,{avg_length:.4f},{time:.2f}")
+    for i, run in enumerate(runs):
+        print(f"Run {i+1}: ")
+        accuracy, avg_length, time = run.result()
+        stats[i, :] = [accuracy, avg_length, time]
+
+        print(f"{accuracy:.2f}%,{avg_length:.4f},{time:.2f}")
+
+# Only a record of the last sampled list (game.py does not read it), written once the runs are over
+with open('data/r_wordlist.yaml', 'w') as f:
+    yaml.dump(word_list, f)
 
 print()
 print(f"Completed {N_INIT} runs.\n\nAverage metrics: ")
@@ -50,4 +70,4 @@ std_length = np.std(stats[:, 1])
 min_length = np.min(stats[:, 1])
 max_length = np.max(stats[:, 1])
 print(f"Length = {avg_length:.4f} (std: {std_length:.4f}, interval: [{min_length:.4f}, {max_length:.4f}])")
-print(f"Time = {np.mean(stats[:, 2]):.4f}")
+print(f"Time = {np.mean(stats[:, 2]):.4f} (per run, numba on one thread)")
@@ -1,12 +1,13 @@
 from random import choice, seed
 import yaml
 from collections import Counter
+from common import YamlLoader
 
 class Wordle():
     
     global ALLOWED_GUESSES, word_list
     ALLOWED_GUESSES = 6
-    word_list = yaml.load(open('data/wordlist.yaml'), Loader=yaml.FullLoader)
+    word_list = yaml.load(open('data/wordlist.yaml'), Loader=YamlLoader)
     
     # comment this out for development, use for testing / marking
     # seed(42)